@@ -4,7 +4,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from vector_store import VectorStoreManager
-from rag_engine import RAGEngine
+from rag_engine import RAGEngine, install_llm_cache
 from chat_interface import ChatInterface
 
 
@@ -24,10 +24,11 @@ def main():
         # load pre-built vector store from disk
         print("Loading vector store...")
         vs_manager = VectorStoreManager()
-        vs_manager.load_vectorstore()
+        vs_manager.preload_vectorstore()                # finishes in the background during RAG engine setup
         
         # initialize RAG engine with loaded vector store
         print("Initializing RAG engine...")
+        install_llm_cache()
         rag = RAGEngine(vs_manager)
         
         # create and run interactive chat interface
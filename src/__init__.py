@@ -4,5 +4,7 @@ RAG Automotive Analysis Package
 
 from .document_processor import DocumentProcessor
 from .vector_store import VectorStoreManager
+from .semantic_cache import SemanticCache
+from .cache_store import CacheStore
 
-__all__ = ['DocumentProcessor', 'VectorStoreManager']
\ No newline at end of file
+__all__ = ['DocumentProcessor', 'VectorStoreManager', 'SemanticCache', 'CacheStore']
\ No newline at end of file
@@ -0,0 +1,203 @@
+import atexit
+import pickle
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+class CacheStore:
+    """
+    Class defining the SQLite-backed persistence for the query caches;
+    keeps query embeddings and semantic cache answers across process restarts, with writes applied
+    by a background thread so the query path never waits on disk
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_path: str = "data/cache/query_cache.sqlite"):
+        """
+        Constructor to open (or create) the cache database and start the writer thread
+
+        @params:
+            db_path: Path of the SQLite database file
+
+        @attributes:
+            db_path: Resolved path of the database file
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, vec BLOB NOT NULL, ts REAL NOT NULL, "
+                "PRIMARY KEY (model, text))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "namespace TEXT NOT NULL, query_hash TEXT NOT NULL, embedding BLOB NOT NULL, key TEXT NOT NULL, "
+                "result BLOB NOT NULL, ts REAL NOT NULL, PRIMARY KEY (namespace, query_hash))"
+            )
+
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+        # apply pending writes before the interpreter exits
+        atexit.register(self.close)
+
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=10)
+
+
+    def _write_loop(self):
+        """
+        Applies queued write statements on a dedicated connection until close() is called
+        """
+        conn = self._connect()
+        try:
+            while True:
+                item = self._writes.get()
+                try:
+                    if item is self._STOP:
+                        break
+                    sql, params = item
+                    with conn:
+                        conn.execute(sql, params)
+                except Exception as e:
+                    # persistence is best-effort; the in-memory caches stay authoritative
+                    print(f" Ignoring failed cache write: {str(e)}")
+                finally:
+                    self._writes.task_done()
+        finally:
+            conn.close()
+
+
+    def _submit(self, sql: str, params: tuple):
+        if self._writer.is_alive():
+            self._writes.put((sql, params))
+
+
+    @staticmethod
+    def _to_blob(vec) -> bytes:
+        return np.asarray(vec, dtype=np.float32).tobytes()
+
+
+    @staticmethod
+    def _from_blob(blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.float32)
+
+
+    def load_query_embeddings(self, model: str, limit: int) -> List[Tuple[str, List[float]]]:
+        """
+        Reads the most recently stored query embeddings of an embedding model
+
+        @params:
+            model: Embedding model the vectors were computed with
+            limit: Max num of entries to return
+
+        @returns:
+            List of (text, embedding) tuples, oldest first
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT text, vec FROM embeddings WHERE model = ? ORDER BY ts DESC LIMIT ?", (model, limit)
+            ).fetchall()
+
+        return [(text, self._from_blob(vec).tolist()) for text, vec in reversed(rows)]
+
+
+    def put_query_embedding(self, model: str, text: str, embedding: List[float], ts: float):
+        """
+        Queues a query embedding to be stored
+
+        @params:
+            model: Embedding model the vector was computed with
+            text: Query text
+            embedding: Its embedding vector
+            ts: Wall-clock time of the insert
+        """
+        self._submit(
+            "INSERT OR REPLACE INTO embeddings (model, text, vec, ts) VALUES (?, ?, ?, ?)",
+            (model, text, self._to_blob(embedding), ts)
+        )
+
+
+    def load_answers(self, namespace: str, since: float) -> List[Tuple[np.ndarray, str, Dict, float]]:
+        """
+        Reads the stored semantic cache answers of a namespace inserted after a point in time
+
+        @params:
+            namespace: Cache namespace (identifies the vector store the answers were computed on)
+            since: Wall-clock time; older answers are skipped
+
+        @returns:
+            List of (embedding, key, result, ts) tuples, oldest first
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT embedding, key, result, ts FROM answers WHERE namespace = ? AND ts > ? ORDER BY ts",
+                (namespace, since)
+            ).fetchall()
+
+        # expired answers are never served again, whatever their namespace
+        self._submit("DELETE FROM answers WHERE ts <= ?", (since,))
+
+        answers = []
+        for embedding, key, result, ts in rows:
+            try:
+                answers.append((self._from_blob(embedding), key, pickle.loads(result), ts))
+            except Exception:
+                continue
+
+        return answers
+
+
+    def put_answer(self, namespace: str, query_hash: str, embedding: np.ndarray, key: str, result: Dict, ts: float):
+        """
+        Queues a semantic cache answer to be stored
+
+        @params:
+            namespace: Cache namespace
+            query_hash: Key of the entry within the namespace
+            embedding: Normalized query embedding
+            key: Exact-match key of the query
+            result: Result dictionary
+            ts: Wall-clock time of the insert
+        """
+        self._submit(
+            "INSERT OR REPLACE INTO answers (namespace, query_hash, embedding, key, result, ts) VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, query_hash, self._to_blob(embedding), key,
+             pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), ts)
+        )
+
+
+    def clear_answers(self, namespace: Optional[str] = None):
+        """
+        Queues removal of the stored answers of a namespace (all namespaces if None)
+        """
+        if namespace is None:
+            self._submit("DELETE FROM answers", ())
+        else:
+            self._submit("DELETE FROM answers WHERE namespace = ?", (namespace,))
+
+
+    def flush(self):
+        """
+        Blocks until all queued writes are applied
+        """
+        if self._writer.is_alive():
+            self._writes.join()
+
+
+    def close(self):
+        """
+        Applies the pending writes and stops the writer thread
+        """
+        if self._writer.is_alive():
+            self._writes.put(self._STOP)
+            self._writer.join()
@@ -4,10 +4,17 @@ from typing import Union
 from colorama import Fore, Style, init
 
 try:
-    from rag_engine import RAGEngine
+    from rag_engine import RAGEngine, install_llm_cache
 except ImportError:
     RAGEngine = None
 
+try:
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.formatted_text import HTML
+    from prompt_toolkit.history import InMemoryHistory
+except ImportError:
+    PromptSession = None
+
 from vector_store import VectorStoreManager
 
 init(autoreset=True)
@@ -30,39 +37,60 @@ class ChatInterface:
         @attributes:
             rag: RAG engine used for query processing based on provided context
             running: Boolean flag to check whether chat loop is active
+            session: prompt_toolkit session with input history, created lazily when the chat loop starts
         """
         self.rag = rag_engine
         self.running = False
+        self.session = None
+        
+        # static UI text is composed once and written with a single call
+        self._header_str = self._build_header()
+        self._examples_str = self._build_examples()
+        self._help_str = self._build_help()
+        
+        # chat commands (lowercased) mapped to their handlers; each returns whether to keep chatting
+        self._commands = {
+            'exit': self._cmd_exit,
+            'quit': self._cmd_exit,
+            'q': self._cmd_exit,
+            'clear': self._cmd_clear,
+            'examples': self._cmd_examples,
+            'help': self._cmd_help,
+        }
     
 
-    def print_header(self):
+    def _build_header(self) -> str:
         """
-        Prints application header information; plus commands list
+        Composes the application header and commands list
+        
+        @returns:
+            Header string with color codes baked in
         """
-        os.system('clear' if os.name == 'posix' else 'cls')
-        print(Fore.CYAN + "="*70)
-        print(Fore.CYAN + "  RAG AUTOMOTIVE ANALYSIS SYSTEM")
-        print(Fore.CYAN + "  Query BMW, Tesla, and Ford Annual Reports")
-        print(Fore.CYAN + "="*70)
-        print()
-        print(Fore.YELLOW + "Commands:")
-        print(Fore.YELLOW + "  • Type your question and press Enter")
-        print(Fore.YELLOW + "  • 'exit', 'quit', or 'q' to close")
-        print(Fore.YELLOW + "  • 'clear' to clear conversation history")
-        print(Fore.YELLOW + "  • 'examples' to see example questions")
-        print(Fore.YELLOW + "  • 'help' for more information")
-        print(Fore.CYAN + "="*70)
-        print()
+        lines = [
+            Fore.CYAN + "="*70,
+            Fore.CYAN + "  RAG AUTOMOTIVE ANALYSIS SYSTEM",
+            Fore.CYAN + "  Query BMW, Tesla, and Ford Annual Reports",
+            Fore.CYAN + "="*70,
+            "",
+            Fore.YELLOW + "Commands:",
+            Fore.YELLOW + "  • Type your question and press Enter",
+            Fore.YELLOW + "  • 'exit', 'quit', or 'q' to close",
+            Fore.YELLOW + "  • 'clear' to clear conversation history",
+            Fore.YELLOW + "  • 'examples' to see example questions",
+            Fore.YELLOW + "  • 'help' for more information",
+            Fore.CYAN + "="*70,
+            "",
+        ]
+        return "\n".join(line + Style.RESET_ALL for line in lines) + "\n"
     
 
-    def print_examples(self):
+    def _build_examples(self) -> str:
         """
-        Prints example questions; grouped by different query types (for user guidance)
-        """
-        print(Fore.CYAN + "\n" + "="*70)
-        print(Fore.CYAN + "EXAMPLE QUESTIONS")
-        print(Fore.CYAN + "="*70)
+        Composes the example questions; grouped by different query types
         
+        @returns:
+            Examples string with color codes baked in
+        """
         examples = [
             ("Simple Queries", [
                 "What was BMW's total revenue in 2023?",
@@ -86,22 +114,33 @@ class ChatInterface:
             ])
         ]
         
+        lines = [
+            Fore.CYAN + "\n" + "="*70,
+            Fore.CYAN + "EXAMPLE QUESTIONS",
+            Fore.CYAN + "="*70,
+        ]
+        
         for category, questions in examples:
-            print(f"\n{Fore.GREEN}{category}:")
+            lines.append(f"\n{Fore.GREEN}{category}:")
             for i, q in enumerate(questions, 1):
-                print(f"  {i}. {q}")
+                lines.append(f"  {i}. {q}")
         
-        print(Fore.CYAN + "\n" + "="*70 + "\n")
+        lines.append(Fore.CYAN + "\n" + "="*70 + "\n")
+        return "\n".join(line + Style.RESET_ALL for line in lines) + "\n"
     
 
-    def print_help(self):
+    def _build_help(self) -> str:
         """
-        Prints support information and query tips (for user guidance)
+        Composes the support information and query tips
+        
+        @returns:
+            Help string with color codes baked in
         """
-        print(Fore.CYAN + "\n" + "="*70)
-        print(Fore.CYAN + "HELP & TIPS")
-        print(Fore.CYAN + "="*70)
-        print(f"""
+        lines = [
+            Fore.CYAN + "\n" + "="*70,
+            Fore.CYAN + "HELP & TIPS",
+            Fore.CYAN + "="*70,
+            f"""
             {Fore.GREEN}How to use:
             • Ask questions in natural language
             • Be specific about company names and years
@@ -125,25 +164,69 @@ class ChatInterface:
             • Ask one question at a time for clearer answers
 
             {Fore.YELLOW}Note: Answers are based solely on the annual reports provided.
-        """)
-        print(Fore.CYAN + "="*70 + "\n")
+        """,
+            Fore.CYAN + "="*70 + "\n",
+        ]
+        return "\n".join(line + Style.RESET_ALL for line in lines) + "\n"
     
 
-    def format_answer(self, answer: str, sources: str) -> str:
+    def print_header(self):
         """
-        Formats the model-generated answer for terminal display
-        
-        @params:
-            answer: Final query answer text from the RAG engine
-            sources: Source information string
-        
-        @returns:
-            output: Final output string with answer and referenced sources
+        Prints application header information; plus commands list
+        """
+        os.system('clear' if os.name == 'posix' else 'cls')
+        sys.stdout.write(self._header_str)
+        sys.stdout.flush()
+    
+
+    def print_examples(self):
+        """
+        Prints example questions; grouped by different query types (for user guidance)
+        """
+        sys.stdout.write(self._examples_str)
+        sys.stdout.flush()
+    
+
+    def print_help(self):
+        """
+        Prints support information and query tips (for user guidance)
+        """
+        sys.stdout.write(self._help_str)
+        sys.stdout.flush()
+    
+
+    def _cmd_exit(self) -> bool:
+        """
+        Handles the exit commands
         """
-        output = f"\n{Fore.GREEN}Answer:\n"
-        output += f"{Fore.WHITE}{answer}\n"
-        output += f"{Fore.CYAN}{sources}\n"
-        return output
+        print(f"\n{Fore.YELLOW}Thank you for using RAG Automotive Analysis. Goodbye!")
+        return False
+    
+
+    def _cmd_clear(self) -> bool:
+        """
+        Handles the clear command; resets conversation history and cached answers
+        """
+        self.rag.clear_history()
+        self.print_header()
+        print(f"{Fore.GREEN} Conversation history cleared\n")
+        return True
+    
+
+    def _cmd_examples(self) -> bool:
+        """
+        Handles the examples command
+        """
+        self.print_examples()
+        return True
+    
+
+    def _cmd_help(self) -> bool:
+        """
+        Handles the help command
+        """
+        self.print_help()
+        return True
     
 
     def process_query(self, user_input: str) -> bool:
@@ -158,27 +241,10 @@ class ChatInterface:
         """
         user_input = user_input.strip()
         
-        # handle exit commands
-        if user_input.lower() in ['exit', 'quit', 'q']:
-            print(f"\n{Fore.YELLOW}Thank you for using RAG Automotive Analysis. Goodbye!")
-            return False
-        
-        # handle clear command
-        if user_input.lower() == 'clear':
-            self.rag.clear_history()
-            self.print_header()
-            print(f"{Fore.GREEN} Conversation history cleared\n")
-            return True
-        
-        # handle examples command
-        if user_input.lower() == 'examples':
-            self.print_examples()
-            return True
-        
-        # handle help command
-        if user_input.lower() == 'help':
-            self.print_help()
-            return True
+        # handle commands (exit/quit/q, clear, examples, help)
+        handler = self._commands.get(user_input.lower())
+        if handler is not None:
+            return handler()
         
         # handle empty input
         if not user_input:
@@ -187,17 +253,62 @@ class ChatInterface:
         # process the query through RAG engine
         print(f"{Fore.YELLOW}Searching and analyzing...")
         
-        result = self.rag.query(user_input)
+        result = self.stream_answer(user_input)
         
         if result["success"]:
             sources = self.rag.format_sources(result["source_documents"])
-            print(self.format_answer(result["answer"], sources))
+            print(f"{Fore.CYAN}{sources}\n")
         else:
             print(f"\n{Fore.RED}Error: {result['answer']}\n")
         
         return True
     
 
+    def stream_answer(self, question: str) -> dict:
+        """
+        Runs a query through the RAG engine and writes the answer to the terminal token by token
+        
+        @params:
+            question: User's natural language question
+        
+        @returns:
+            result: Query result dictionary with answer, sources, success flag
+        """
+        stream = self.rag.query_stream(question)
+        started = False
+        
+        for token in stream:
+            if not started:
+                sys.stdout.write(f"\n{Fore.GREEN}Answer:\n{Fore.WHITE}")
+                started = True
+            sys.stdout.write(token)
+            sys.stdout.flush()
+        
+        result = stream.result
+        
+        if started:
+            sys.stdout.write(Style.RESET_ALL + "\n")
+            sys.stdout.flush()
+        
+        return result
+    
+
+    def read_input(self) -> str:
+        """
+        Reads one line of user input; uses prompt_toolkit (line editing + history) on interactive
+        terminals when available, plain input() otherwise
+        
+        @returns:
+            Raw user input string
+        """
+        if PromptSession is not None and sys.stdin.isatty() and sys.stdout.isatty():
+            if self.session is None:
+                self.session = PromptSession(history=InMemoryHistory())
+            return self.session.prompt(HTML('<ansicyan>You: </ansicyan>'))
+        
+        return input(f"{Fore.CYAN}You: {Style.RESET_ALL}")
+    
+
     def run(self):
         """
         Initializes the main interactive chat thread and runs it; continuously accepts user input in iterations
@@ -211,7 +322,7 @@ class ChatInterface:
         while self.running:
             try:
                 # fetch user input
-                user_input = input(f"{Fore.CYAN}You: {Style.RESET_ALL}")
+                user_input = self.read_input()
                 
                 # process the input
                 should_continue = self.process_query(user_input)
@@ -224,24 +335,45 @@ class ChatInterface:
                 print(f"\n\n{Fore.YELLOW}Interrupted. Type 'exit' to quit or continue asking questions.\n")
                 continue
             
+            except EOFError:
+                # Ctrl-D / closed stdin ends the session like 'exit'
+                print(f"\n{Fore.YELLOW}Thank you for using RAG Automotive Analysis. Goodbye!")
+                self.running = False
+                break
+            
             except Exception as e:
                 print(f"\n{Fore.RED}Unexpected error: {str(e)}\n")
                 continue
     
 
-    def run_single_query(self, question: str, show_sources: bool = True):
+    def run_single_query(self, question: str, show_sources: bool = True) -> dict:
         """
         Run a single query (without entering the interactive chat thread); for testing/demo purposes
         
         @params:
             question: Questions to ask the RAG system
             show_sources: Boolean to check Whether to display source documents; defaults to True
+        
+        @returns:
+            result: Query result dictionary with answer, sources, success flag
         """
         print(f"{Fore.CYAN}Question: {Fore.WHITE}{question}")
         print(Fore.YELLOW + "Searching and analyzing...")
         
-        result = self.rag.query(question)
+        result = self.rag.query(question, return_sources=show_sources)
+        self.print_result(result, show_sources)
+        
+        return result
+    
+
+    def print_result(self, result: dict, show_sources: bool = True):
+        """
+        Prints a query result computed elsewhere (e.g. in a batch of concurrent queries)
         
+        @params:
+            result: Query result dictionary with answer, sources, success flag
+            show_sources: Boolean to check Whether to display source documents; defaults to True
+        """
         if result["success"]:
             print(f"\n{Fore.GREEN}Answer:")
             print(f"{Fore.WHITE}{result['answer']}")
@@ -263,12 +395,13 @@ def main():
         # load vector store
         print("Loading vector store...")
         vs_manager = VectorStoreManager()
-        vs_manager.load_vectorstore()
+        vs_manager.preload_vectorstore()                # finishes in the background during RAG engine setup
         
         # initialize RAG engine
         print("Initializing RAG engine...")
         
         if RAGEngine:
+            install_llm_cache()
             rag = RAGEngine(vs_manager)
             print(f"{Fore.GREEN} Using RAG Engine")
         else:
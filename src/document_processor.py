@@ -1,14 +1,41 @@
+import hashlib
 import os
+import pickle
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from tqdm import tqdm
-import pdfplumber
+import fitz
 import re
 
 
+COMPANIES = ["BMW", "Tesla", "Ford"]
+
+# pages with fewer horizontal rules than this cannot hold a ruled table, so table detection is skipped
+MIN_TABLE_EDGES = 4
+
+# bump whenever the extracted page text changes, so cached extraction results and chunks are rebuilt
+EXTRACTOR_VERSION = 2
+
+
+def _extract_pdf_task(task: Tuple[str, Path]) -> Tuple[str, Path, Optional[List[Dict]]]:
+    """
+    Worker entry point for the extraction process pool; kept at module level so it pickles cleanly
+
+    @params:
+        task: (company, pdf_path) tuple describing one PDF to extract
+
+    @returns:
+        (company, pdf_path, pages_data) tuple; pages_data is None if extraction failed
+    """
+    company, pdf_path = task
+    return company, pdf_path, DocumentProcessor.extract_text_with_pymupdf(pdf_path)
+
+
 class DocumentProcessor:
 
     """
@@ -16,7 +43,11 @@ class DocumentProcessor:
     Splits documents into overlapping chunks to maintain semantic coherence for RAG retrieval
     """
     
-    def __init__(self, data_dir: str = "data/raw", chunk_size: int = 1500, chunk_overlap: int = 300):
+    # 4-digit year starting with "20" in report filenames
+    _YEAR_RE = re.compile(r'20\d{2}')
+    
+    def __init__(self, data_dir: str = "data/raw", chunk_size: int = 1500, chunk_overlap: int = 300,
+                 max_workers: Optional[int] = None, cache_dir: Optional[str] = "data/cache"):
         """
         Constructor to initialize the document processor object with chunking parameters
         
@@ -24,16 +55,26 @@ class DocumentProcessor:
             data_dir: Path to directory containing company subdirectories with PDFs
             chunk_size: Max size of each text chunk in characters 
             chunk_overlap: Num of overlapping characters between consecutive chunks
+            max_workers: Num of processes used for PDF extraction; defaults to os.cpu_count()
+            cache_dir: Directory for cached extraction/chunking output keyed by PDF hash; None disables caching
         
         @attributes:
             data_dir: Resolved path to the data directory
             chunk_size: Configured chunk size
             chunk_overlap: Configured overlap size
+            max_workers: Configured extraction process count
+            cache_dir: Resolved path to the cache directory, None if caching is disabled
             text_splitter: LangChain text splitter
         """
         self.data_dir = Path(data_dir)
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers or os.cpu_count()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._file_hashes: Dict[Path, str] = {}
+        
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         # initialize recursive text splitter with hierarchical separators
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -44,9 +85,10 @@ class DocumentProcessor:
         )
         
 
-    def extract_text_with_pdfplumber(self, pdf_path: Path) -> List[Dict]:
+    @staticmethod
+    def extract_text_with_pymupdf(pdf_path: Path) -> List[Dict]:
         """
-        Extracts text and tables from PDF using pdfplumber library; 
+        Extracts text and tables from PDF using PyMuPDF (fitz) library; 
         (tables are converted to pipe-separated text format and marked with [TABLE] tags
         for easier identification by the LLM)
    
@@ -62,28 +104,32 @@ class DocumentProcessor:
         pages_data = []
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
+            with fitz.open(pdf_path) as pdf:
+                for page_num, page in enumerate(pdf):
                     # extract regular text content from page
-                    text = page.extract_text() or ""
+                    parts = [page.get_text("text") or ""]
                     
-                    # extract tables and convert to readable text format
-                    tables = page.extract_tables()
-                    table_text = ""
+                    # extract tables and convert to readable text format; table detection is expensive,
+                    # so skip it on narrative pages without enough horizontal rules
+                    if DocumentProcessor._count_horizontal_edges(page) < MIN_TABLE_EDGES:
+                        tables = None
+                    else:
+                        tables = page.find_tables().tables
                     
                     if tables:
                         for table in tables:
                             # mark table boundaries for LLM recognition
-                            table_text += "\n\n[TABLE]\n"
-                            for row in table:
-                                if row:
-                                    # filter out None/empty cells and join with pipe separator
-                                    row_text = " | ".join([str(cell) for cell in row if cell])
-                                    table_text += row_text + "\n"
-                            table_text += "[/TABLE]\n\n"
+                            parts.append("\n\n[TABLE]\n")
+                            for row in table.extract():
+                                # skip rows without any cell content
+                                if not row or not any(row):
+                                    continue
+                                # cells are already str or None; drop empty ones and join with pipe separator
+                                parts.append(" | ".join(cell for cell in row if cell) + "\n")
+                            parts.append("[/TABLE]\n\n")
                     
-                    # combine regular text with extracted table text
-                    combined_text = text + table_text
+                    # combine regular text with extracted table text in a single join
+                    combined_text = "".join(parts)
                     
                     pages_data.append({
                         "page_content": combined_text,
@@ -91,97 +137,284 @@ class DocumentProcessor:
                     })
                     
         except Exception as e:
-            print(f"Error with pdfplumber on {pdf_path.name}: {str(e)}")
+            print(f"Error with PyMuPDF on {pdf_path.name}: {str(e)}")
             # return None to trigger PyPDF fallback in calling function
             return None
         
         return pages_data
     
 
-    def load_pdfs_from_directory(self, company: str) -> List[Document]:
+    @staticmethod
+    def _count_horizontal_edges(page) -> int:
         """
-        Loads all PDF files from a specific company's directory
+        Counts horizontal line segments in a page's vector drawings; a cheap precheck for ruled tables
+        
+        @params:
+            page: PyMuPDF page object
+            
+        @returns:
+            edges: Number of horizontal lines (rectangles and quads count their top and bottom edges)
+        """
+        edges = 0
+        for path in page.get_cdrawings():
+            for item in path["items"]:
+                if item[0] == "l":
+                    start, end = item[1], item[2]
+                    if abs(start[1] - end[1]) < 1:
+                        edges += 1
+                elif item[0] in ("re", "qu"):
+                    edges += 2
+        return edges
+    
+
+    def _file_hash(self, pdf_path: Path) -> str:
+        """
+        Computes (and memoizes) the SHA-1 hash of a PDF's bytes; used as the cache key
+        
+        @params:
+            pdf_path: Path object pointing to the PDF file
+            
+        @returns:
+            Hex digest of the file contents
+        """
+        if pdf_path not in self._file_hashes:
+            self._file_hashes[pdf_path] = hashlib.sha1(pdf_path.read_bytes()).hexdigest()
+        return self._file_hashes[pdf_path]
+    
+
+    def _extraction_cache_name(self, pdf_path: Path) -> str:
+        """
+        Builds the extraction cache file name of a PDF; covers the file contents and every setting the
+        extracted text depends on
+        """
+        return f"{self._file_hash(pdf_path)}_v{EXTRACTOR_VERSION}_e{MIN_TABLE_EDGES}.pkl"
+    
+
+    def _read_cache(self, name: str):
+        """
+        Loads a pickled object from the cache directory
+        
+        @params:
+            name: File name within the cache directory
+            
+        @returns:
+            The cached object, or None if caching is disabled or the entry is missing/unreadable
+        """
+        if self.cache_dir is None:
+            return None
+        
+        cache_path = self.cache_dir / name
+        if not cache_path.exists():
+            return None
+        
+        try:
+            with open(cache_path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"   Ignoring unreadable cache entry {name}: {str(e)}")
+            return None
+    
+
+    def _write_cache(self, name: str, obj) -> None:
+        """
+        Pickles an object into the cache directory (no-op if caching is disabled)
+        
+        @params:
+            name: File name within the cache directory
+            obj: Object to store
+        """
+        if self.cache_dir is None:
+            return
+        
+        # write to a temp file first so an interrupted run never leaves a truncated entry
+        cache_path = self.cache_dir / name
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    
+
+    def _find_pdfs(self, company: str, warn: bool = True) -> List[Path]:
+        """
+        Finds all PDF files in a specific company's directory
         
         @params:
             company: Company name matching the subdirectory name (e.g., "BMW", "Tesla", "Ford")
+            warn: Whether to print a warning for missing/empty directories
             
         @returns:
-            documents: List of LangChain Document objects, one per page from all PDFs in the company directory
+            pdf_files: List of PDF paths; empty if the directory is missing or has no PDFs
         """
         company_dir = self.data_dir / company
-        documents = []
         
         # check if company directory exists
         if not company_dir.exists():
-            print(f"Warning: Directory {company_dir} does not exist.")
-            return documents
+            if warn:
+                print(f"Warning: Directory {company_dir} does not exist.")
+            return []
         
         # find all PDF files in the company directory
-        pdf_files = list(company_dir.glob("*.pdf"))
+        pdf_files = sorted(company_dir.glob("*.pdf"))
         
-        if not pdf_files:
+        if not pdf_files and warn:
             print(f"Warning: No PDF files found in {company_dir}")
-            return documents
         
-        print(f"\nLoading PDFs for {company}...")
-        for pdf_path in tqdm(pdf_files, desc=f"Processing {company}"):
+        return pdf_files
+    
+
+    def _load_pdfs(self, tasks: List[Tuple[str, Path]], desc: str) -> List[Document]:
+        """
+        Extracts a batch of PDFs in parallel worker processes and builds Document objects on the main process
+        
+        @params:
+            tasks: List of (company, pdf_path) tuples to extract
+            desc: Progress bar description
+            
+        @returns:
+            documents: List of LangChain Document objects, one per page, in the same order as tasks
+        """
+        if not tasks:
+            return []
+        
+        # serve unchanged PDFs from the extraction cache
+        results = [None] * len(tasks)
+        pending = []
+        for i, (company, pdf_path) in enumerate(tasks):
+            pages_data = self._read_cache(self._extraction_cache_name(pdf_path))
+            if pages_data is not None:
+                results[i] = (company, pdf_path, pages_data)
+            else:
+                pending.append(i)
+        
+        if len(pending) < len(tasks):
+            print(f"  {len(tasks) - len(pending)}/{len(tasks)} PDFs served from extraction cache")
+        
+        # PDF parsing is CPU-bound, so fan the remaining PDFs out across processes
+        if pending:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(pending))) as executor:
+                futures = {executor.submit(_extract_pdf_task, tasks[i]): i for i in pending}
+                for future in tqdm(as_completed(futures), total=len(futures), desc=desc, mininterval=0.5):
+                    i = futures[future]
+                    company, pdf_path = tasks[i]
+                    try:
+                        results[i] = future.result()
+                        pages_data = results[i][2]
+                        if pages_data:
+                            self._write_cache(self._extraction_cache_name(pdf_path), pages_data)
+                    except Exception as e:
+                        print(f"   Error loading {pdf_path.name}: {str(e)}")
+        
+        per_pdf_documents = []
+        for result in results:
+            if result is None:
+                continue
+            company, pdf_path, pages_data = result
             try:
-                pages_data = self.extract_text_with_pdfplumber(pdf_path)
-                
-                if pages_data:
-                    # create Document objects from pdfplumber extraction
-                    for page_data in pages_data:
-                        doc = Document(
-                            page_content=page_data["page_content"],
-                            metadata={
-                                "company": company,
-                                "source_file": pdf_path.name,
-                                "year": self._extract_year_from_filename(pdf_path.name),
-                                "page": page_data["page_number"]
-                            }
-                        )
-                        documents.append(doc)
-                    
-                    print(f"  Loaded {pdf_path.name}: {len(pages_data)} pages (with tables)")
-                else:
-                    loader = PyPDFLoader(str(pdf_path))
-                    docs = loader.load()
-                    
-                    # add metadata to PyPDF documents
-                    for doc in docs:
-                        doc.metadata.update({
-                            "company": company,
-                            "source_file": pdf_path.name,
-                            "year": self._extract_year_from_filename(pdf_path.name)
-                        })
-                    
-                    documents.extend(docs)
-                    print(f"   Loaded {pdf_path.name}: {len(docs)} pages (fallback)")
-                
+                per_pdf_documents.append(self._build_documents(company, pdf_path, pages_data))
             except Exception as e:
                 print(f"   Error loading {pdf_path.name}: {str(e)}")
         
+        # page counts are known at this point, so size the combined list once
+        documents = [None] * sum(len(docs) for docs in per_pdf_documents)
+        pos = 0
+        for docs in per_pdf_documents:
+            documents[pos:pos + len(docs)] = docs
+            pos += len(docs)
+        
         return documents
+    
+
+    def _build_documents(self, company: str, pdf_path: Path, pages_data: Optional[List[Dict]]) -> List[Document]:
+        """
+        Builds Document objects for a single PDF; falls back to PyPDF if PyMuPDF extraction failed
+        
+        @params:
+            company: Company name the PDF belongs to
+            pdf_path: Path object pointing to the PDF file
+            pages_data: Per-page output of extract_text_with_pymupdf, or None on failure
+            
+        @returns:
+            documents: List of LangChain Document objects, one per page of the PDF
+        """
+        year = self._extract_year_from_filename(pdf_path.name)
+        
+        if pages_data:
+            # create Document objects from PyMuPDF extraction
+            documents = [
+                Document(
+                    page_content=page_data["page_content"],
+                    metadata={
+                        "company": company,
+                        "source_file": pdf_path.name,
+                        "year": year,
+                        "page": page_data["page_number"]
+                    }
+                )
+                for page_data in pages_data
+            ]
+            
+            print(f"  Loaded {pdf_path.name}: {len(pages_data)} pages (with tables)")
+        else:
+            loader = PyPDFLoader(str(pdf_path))
+            documents = loader.load()
+            
+            # add metadata to PyPDF documents
+            for doc in documents:
+                doc.metadata.update({
+                    "company": company,
+                    "source_file": pdf_path.name,
+                    "year": year
+                })
+            
+            print(f"   Loaded {pdf_path.name}: {len(documents)} pages (fallback)")
+        
+        return documents
+    
+
+    def load_pdfs_from_directory(self, company: str) -> List[Document]:
+        """
+        Loads all PDF files from a specific company's directory
+        
+        @params:
+            company: Company name matching the subdirectory name (e.g., "BMW", "Tesla", "Ford")
+            
+        @returns:
+            documents: List of LangChain Document objects, one per page from all PDFs in the company directory
+        """
+        tasks = [(company, pdf_path) for pdf_path in self._find_pdfs(company)]
+        
+        print(f"\nLoading PDFs for {company}...")
+        return self._load_pdfs(tasks, desc=f"Processing {company}")
+
+
+    def _find_all_pdfs(self, warn: bool = True) -> List[Tuple[str, Path]]:
+        """
+        Finds the PDFs of all companies; flattened so the process pool is kept busy across companies
+        
+        @params:
+            warn: Whether to print a warning for missing/empty directories
+        
+        @returns:
+            tasks: List of (company, pdf_path) tuples
+        """
+        tasks = []
+        for company in COMPANIES:
+            tasks.extend((company, pdf_path) for pdf_path in self._find_pdfs(company, warn=warn))
+        return tasks
 
 
     def load_all_documents(self) -> List[Document]:
         """
-        Loads PDF documents from all company directories; processes files sequentially
+        Loads PDF documents from all company directories; PDFs of all companies are extracted in parallel
         
         @returns:
             all_documents: Combined list of Document objects from all companies
         """
-        all_documents = []
-        companies = ["BMW", "Tesla", "Ford"]
-        
         print("="*60)
         print("LOADING ANNUAL REPORTS")
         print("="*60)
         
-        # process each company's PDFs sequentially
-        for company in companies:
-            docs = self.load_pdfs_from_directory(company)
-            all_documents.extend(docs)
+        all_documents = self._load_pdfs(self._find_all_pdfs(), desc="Processing PDFs")
         
         print(f"\n Total documents loaded: {len(all_documents)}")
         return all_documents
@@ -202,11 +435,8 @@ class DocumentProcessor:
         print("="*60)
         print(f"Chunk size: {self.chunk_size}, Overlap: {self.chunk_overlap}")
         
-        chunks = []
-        for doc in tqdm(documents, desc="Chunking documents"):
-            # split each document into chunks
-            doc_chunks = self.text_splitter.split_documents([doc])
-            chunks.extend(doc_chunks)
+        # split all documents in a single call; the splitter handles the list directly
+        chunks = self.text_splitter.split_documents(documents)
         
         print(f"Created {len(chunks)} chunks from {len(documents)} documents")
         return chunks
@@ -214,11 +444,24 @@ class DocumentProcessor:
 
     def process_all_documents(self) -> List[Document]:
         """
-        Executes the complete document processing pipeline for RAG   
+        Executes the complete document processing pipeline for RAG; chunks (and per-PDF extraction output)
+        are served from the cache directory when the PDFs and chunking parameters are unchanged
 
         @returns:
             chuncks: List of chunked Document objects ready for embedding
         """
+        # chunks only depend on the raw PDFs, the extraction settings and the chunking parameters
+        key_source = "|".join(
+            [f"v{EXTRACTOR_VERSION}", str(MIN_TABLE_EDGES), str(self.chunk_size), str(self.chunk_overlap)]
+            + [f"{company}/{self._file_hash(pdf_path)}" for company, pdf_path in self._find_all_pdfs(warn=False)]
+        )
+        chunks_cache_name = f"chunks_{hashlib.sha1(key_source.encode()).hexdigest()}.pkl"
+        
+        chunks = self._read_cache(chunks_cache_name)
+        if chunks is not None:
+            print(f"Loaded {len(chunks)} chunks from cache")
+            return chunks
+        
         # load all documents from all company directories
         documents = self.load_all_documents()
         
@@ -227,6 +470,7 @@ class DocumentProcessor:
         
         # split documents into chunks
         chunks = self.chunk_documents(documents)
+        self._write_cache(chunks_cache_name, chunks)
         return chunks
     
 
@@ -241,7 +485,7 @@ class DocumentProcessor:
         @returns:
             Extracted year as string
         """
-        match = re.search(r'20\d{2}', filename)
+        match = self._YEAR_RE.search(filename)
         return match.group(0) if match else "Unknown"
     
 
@@ -259,20 +503,16 @@ class DocumentProcessor:
                     - 'by_company' (Dict[str, int]): Document count per company
                     - 'by_year' (Dict[str, int]): Document count per year
         """
+        # aggregate counts by company and year
+        by_company = Counter(doc.metadata.get("company", "Unknown") for doc in documents)
+        by_year = Counter(doc.metadata.get("year", "Unknown") for doc in documents)
+        
         stats = {
             "total_documents": len(documents),
-            "by_company": {},
-            "by_year": {}
+            "by_company": dict(by_company),
+            "by_year": dict(by_year)
         }
         
-        # aggregate counts by company and year
-        for doc in documents:
-            company = doc.metadata.get("company", "Unknown")
-            year = doc.metadata.get("year", "Unknown")
-            
-            stats["by_company"][company] = stats["by_company"].get(company, 0) + 1
-            stats["by_year"][year] = stats["by_year"].get(year, 0) + 1
-        
         return stats
 
 
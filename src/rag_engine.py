@@ -1,66 +1,524 @@
+import asyncio
 import os
-from typing import List, Dict, Optional
+import queue
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Dict, Optional
+import ahocorasick
 from langchain_openai import ChatOpenAI
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
 from dotenv import load_dotenv
 
 from vector_store import VectorStoreManager
+from semantic_cache import SemanticCache
 
 load_dotenv()
 
+# answer returned without calling the LLM when retrieval finds no documents (e.g. an over-narrow filter)
+NO_DOCS_ANSWER = "I don't have that information in the provided annual reports."
+
+# company names as detected by analyze_query_intent (uppercase) mapped to the stored metadata values
+COMPANY_NAMES = {"BMW": "BMW", "TESLA": "Tesla", "FORD": "Ford"}
+
+# intent keywords: (bucket, value) -> keywords; matched as substrings of the lowercased question
+# (company names only as whole words, optionally plural, so e.g. "affordable" does not signal Ford but "Teslas" does Tesla)
+INTENT_KEYWORDS = {
+    ("company", "BMW"): ["bmw"],
+    ("company", "TESLA"): ["tesla"],
+    ("company", "FORD"): ["ford"],
+    ("metric", "revenue"): ["revenue", "sales", "turnover"],
+    ("metric", "profit"): ["profit", "earnings", "net income", "ebitda", "ebit"],
+    ("metric", "growth"): ["growth", "increase", "trend"],
+    ("metric", "performance"): ["performance", "results"],
+    ("query_type", "comparison"): ["compare", "between", "versus"],
+    ("query_type", "trend"): ["trend", "over", "growth"],
+    ("query_type", "summary"): ["summary", "overview"],
+}
+
+# query types in priority order when several keyword groups match
+QUERY_TYPE_PRIORITY = ["comparison", "trend", "summary"]
+
+# keyword buckets that only match on word boundaries
+WHOLE_WORD_BUCKETS = {"company"}
+
+_YEAR_RE = re.compile(r'20[2-4][0-9]')
+
+# words that refer back to earlier turns, and elliptical openers ("what about ...", "and ...");
+# questions containing them still get rewritten with the history
+_FOLLOW_UP_RE = re.compile(
+    r'\b(it|its|they|them|their|this|that|these|those|same|previous|above|also|instead)\b'
+    r'|\b(what|how)\s+about\b'
+    r'|^\W*and\b',
+    re.IGNORECASE
+)
+
+
+def _build_intent_automaton() -> ahocorasick.Automaton:
+    """
+    Compiles all intent keywords into one Aho-Corasick automaton, so a single pass over the question
+    finds every (possibly overlapping) keyword match
+
+    @returns:
+        Automaton mapping each keyword to its length and the list of (bucket, value) pairs it signals
+    """
+    automaton = ahocorasick.Automaton()
+    
+    # each keyword maps to (keyword length, labels) so matches can be checked against word boundaries
+    for label, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in automaton:
+                automaton.get(keyword)[1].append(label)
+            else:
+                automaton.add_word(keyword, (len(keyword), [label]))
+    
+    automaton.make_automaton()
+    return automaton
+
+
+INTENT_AUTOMATON = _build_intent_automaton()
+
+
+@lru_cache(maxsize=256)
+def _scan_question(question: str) -> tuple:
+    """
+    Scans a question once for intent keywords and years; memoized, since one query is analyzed by
+    several pipeline steps (retrieval pre-filter, standalone check)
+
+    @params:
+        question: User's natural language question
+
+    @returns:
+        (matched, years) tuple; frozenset of matched (bucket, value) labels and tuple of distinct years
+    """
+    text = question.lower()
+    matched = set()
+    for end, (length, labels) in INTENT_AUTOMATON.iter(text):
+        start = end - length + 1
+        after = end + 2 if text[end + 1:end + 2] == "s" else end + 1     # allow a plural "s"
+        whole_word = (start == 0 or not text[start - 1].isalnum()) and (after == len(text) or not text[after].isalnum())
+        matched.update(label for label in labels if whole_word or label[0] not in WHOLE_WORD_BUCKETS)
+    
+    return frozenset(matched), tuple(set(_YEAR_RE.findall(question)))
+
+
+def install_llm_cache(path: str = "data/cache/llm_cache.sqlite"):
+    """
+    Installs LangChain's process-wide LLM cache; called once by the entry points, since the cache is global
+    state shared by every engine (engines created with use_llm_cache=False opt out)
+
+    @params:
+        path: SQLite file caching LLM responses by exact prompt and model settings
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    set_llm_cache(SQLiteCache(database_path=path))
+
+
+class _TokenQueueHandler(BaseCallbackHandler):
+    """
+    Callback handler pushing streamed LLM tokens onto a queue
+    """
+    
+    def __init__(self, token_queue: queue.Queue):
+        self.token_queue = token_queue
+    
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if token:
+            self.token_queue.put(token)
+
+
+class _AsyncTokenQueueHandler(AsyncCallbackHandler):
+    """
+    Async callback handler pushing streamed LLM tokens onto an asyncio queue
+    """
+    
+    def __init__(self, token_queue: asyncio.Queue):
+        self.token_queue = token_queue
+    
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if token:
+            self.token_queue.put_nowait(token)
+
+
+class _StandaloneAwareChain(ConversationalRetrievalChain):
+    """
+    Conversational retrieval chain that skips the standalone-question rewrite (one LLM round trip)
+    for questions that are already self-contained, and that can pick its retriever per retrieval question
+    """
+    
+    is_standalone: Optional[Callable[[str], bool]] = None
+    retriever_for: Optional[Callable[[str], BaseRetriever]] = None
+    
+    def _strip_history(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # with an empty history the parent chain passes the question through unchanged
+        if self.is_standalone is not None and self.is_standalone(inputs["question"]):
+            return {**inputs, "chat_history": []}
+        return inputs
+    
+    def _call(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        return super()._call(self._strip_history(inputs), run_manager=run_manager)
+    
+    async def _acall(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        return await super()._acall(self._strip_history(inputs), run_manager=run_manager)
+    
+    def _retriever_for_question(self, question: str) -> BaseRetriever:
+        return self.retriever_for(question) if self.retriever_for is not None else self.retriever
+    
+    # question is the one retrieval runs on, i.e. already rewritten against the history for follow-ups
+    def _get_docs(self, question: str, inputs: Dict[str, Any], *, run_manager) -> List[Document]:
+        docs = self._retriever_for_question(question).get_relevant_documents(
+            question, callbacks=run_manager.get_child()
+        )
+        return self._reduce_tokens_below_limit(docs)
+    
+    async def _aget_docs(self, question: str, inputs: Dict[str, Any], *, run_manager) -> List[Document]:
+        docs = await self._retriever_for_question(question).aget_relevant_documents(
+            question, callbacks=run_manager.get_child()
+        )
+        return self._reduce_tokens_below_limit(docs)
+
+
+class AnswerStream:
+    """
+    Class defining an iterable over answer tokens as the LLM generates them;
+    the query runs on a background thread, and the final result dictionary is available as
+    `result` once iteration has finished; a successful answer that was not generated token by token
+    (semantic/LLM cache hit, no documents found) is yielded whole
+    """
+    
+    _DONE = object()
+    
+    def __init__(self, run: Callable[[List[BaseCallbackHandler]], Dict[str, any]]):
+        """
+        Constructor to initialize the stream
+        
+        @params:
+            run: Function executing the query with the given callback handlers and returning the result dictionary
+        
+        @attributes:
+            result: Query result dictionary (answer, source_documents, success); None until the stream is exhausted
+        """
+        self.result: Optional[Dict[str, any]] = None
+        self._run = run
+        self._queue = queue.Queue()
+    
+    def _worker(self):
+        try:
+            self.result = self._run([_TokenQueueHandler(self._queue)])
+        except Exception as e:
+            self.result = {
+                "answer": f"Error processing query: {str(e)}",
+                "source_documents": [],
+                "success": False
+            }
+        finally:
+            self._queue.put(self._DONE)
+    
+    def __iter__(self) -> Iterator[str]:
+        thread = threading.Thread(target=self._worker, daemon=True)
+        thread.start()
+        
+        streamed = False
+        while True:
+            token = self._queue.get()
+            if token is self._DONE:
+                break
+            streamed = True
+            yield token
+        
+        thread.join()
+        
+        if not streamed and self.result["success"]:
+            yield self.result["answer"]
+
+
+class AsyncAnswerStream:
+    """
+    Class defining an async iterable over answer tokens as the LLM generates them (async counterpart of
+    AnswerStream); the query runs as a task on the caller's event loop, and the final result dictionary
+    is available as `result` once iteration has finished; unstreamed successful answers are yielded whole
+    """
+    
+    _DONE = object()
+    
+    def __init__(self, run: Callable[[List[BaseCallbackHandler]], Awaitable[Dict[str, any]]]):
+        """
+        Constructor to initialize the stream
+        
+        @params:
+            run: Coroutine function executing the query with the given callback handlers and returning the result dictionary
+        
+        @attributes:
+            result: Query result dictionary (answer, source_documents, success); None until the stream is exhausted
+        """
+        self.result: Optional[Dict[str, any]] = None
+        self._run = run
+    
+    async def _worker(self, token_queue: asyncio.Queue):
+        try:
+            self.result = await self._run([_AsyncTokenQueueHandler(token_queue)])
+        except Exception as e:
+            self.result = {
+                "answer": f"Error processing query: {str(e)}",
+                "source_documents": [],
+                "success": False
+            }
+        finally:
+            token_queue.put_nowait(self._DONE)
+    
+    async def __aiter__(self) -> AsyncIterator[str]:
+        token_queue = asyncio.Queue()
+        task = asyncio.create_task(self._worker(token_queue))
+        
+        streamed = False
+        while True:
+            token = await token_queue.get()
+            if token is self._DONE:
+                break
+            streamed = True
+            yield token
+        
+        await task
+        
+        if not streamed and self.result["success"]:
+            yield self.result["answer"]
+
 
 class RAGEngine:
     """
     Class defining the behaviour of the RAG Engine
     """
     
-    def __init__(self, vector_store_manager: VectorStoreManager):
+    def __init__(self, vector_store_manager: VectorStoreManager, use_semantic_cache: bool = True,
+                 use_llm_cache: bool = True,
+                 semantic_cache: Optional[SemanticCache] = None):
         """
         Constructor to initialize the RAG engine with vector store and LLM components
         
         @params:
             vector_store_manager: Initialized vector store manager with loaded vector store
+            use_semantic_cache: Whether near-duplicate questions are answered from the semantic cache
+            use_llm_cache: Whether LLM calls go through the process-wide LLM cache (see install_llm_cache())
+            semantic_cache: Existing semantic cache to share (e.g. with another engine on the same vector store);
+                a new one is created if None
         
         @attributes:
             vs_manager: Vector store manager for retrieval
-            llm: Language model for answer generation
-            memory: Stores conversation history for context
+            llm: Language model for answer generation; streams tokens to callback handlers
+            condense_llm: Non-streaming language model for rewriting follow-ups into standalone questions
+            memory: Stores conversation history; only the last few exchanges are sent with each query
             qa_prompt: Custom prompt template for financial queries
-            qa_chain: Complete RAG pipeline chain
+            search_kwargs: MMR retriever settings shared by every chain the engine builds
+            qa_chain: Complete RAG pipeline chain; pre-filters retrieval to the companies its (rewritten) question names
+            filtered_retrievers: Metadata-filtered retrievers, built on first use per (companies, year)
+            filtered_chains: Chains with a fixed filtered retriever (query_with_filter), built on first use
+            cache: Semantic cache of recent results keyed by question embedding, None if disabled
         """
         self.vs_manager = vector_store_manager
         
-        if self.vs_manager.vectorstore is None:
-            raise ValueError("Vector store must be loaded before initializing RAG engine")
+        # the answer prompt embeds the retrieved chunks and the standalone question, so an exact prompt
+        # repeat (same question, same retrieved context) is answered from the LLM cache without calling
+        # OpenAI; None defers to the global cache, False bypasses it
+        llm_cache = None if use_llm_cache else False
         
         # initialize LLM with deterministic settings for factual accuracy
         self.llm = ChatOpenAI(
             model=os.getenv("OPENAI_MODEL", "gpt-4o"),
             temperature=0,  # Deterministic responses for consistent financial data
+            streaming=True,  # emit answer tokens to callbacks as they are generated
+            cache=llm_cache
         )
         
-        # initialize conversation memory to support follow-up questions
-        self.memory = ConversationBufferMemory(
+        # separate non-streaming LLM so the question rewrite never shows up in the answer stream
+        self.condense_llm = ChatOpenAI(
+            model=os.getenv("OPENAI_MODEL", "gpt-4o"),
+            temperature=0,
+            cache=llm_cache
+        )
+        
+        # initialize conversation memory to support follow-up questions; the window keeps the
+        # question rewrite prompt bounded instead of growing with every turn
+        self.memory = ConversationBufferWindowMemory(
+            k=4,                                            # num of recent exchanges passed to the chain
             memory_key="chat_history",
             return_messages=True, 
             output_key="answer"  
         )
         
         self.qa_prompt = self._create_qa_prompt()
-        self.qa_chain = ConversationalRetrievalChain.from_llm(
+        
+        # checked only now so a background vector store load overlaps with the setup above
+        if self.vs_manager.vectorstore is None:
+            raise ValueError("Vector store must be loaded before initializing RAG engine")
+        
+        # MMR: fetch 40 nearest chunks, keep the 15 that best balance relevance and diversity
+        # (avoids filling the context with near-duplicate boilerplate from a single filing)
+        self.search_kwargs = {"k": 15, "fetch_k": 40, "lambda_mult": 0.5}
+        self._retriever = self._make_retriever(self.search_kwargs)
+        self.filtered_retrievers: Dict[tuple, BaseRetriever] = {}
+        self.filtered_chains: Dict[tuple, ConversationalRetrievalChain] = {}
+        self._filtered_lock = threading.Lock()
+        self.qa_chain = self._build_chain(self._retriever, retriever_for=self._retriever_for)
+        
+        # serve near-duplicate questions without another retrieval + LLM round trip
+        # (persisted per collection, so answers computed on a rebuilt store are never reloaded)
+        if not use_semantic_cache:
+            self.cache = None
+        elif semantic_cache is not None:
+            self.cache = semantic_cache
+        else:
+            self.cache = SemanticCache(
+                max_size=500, threshold=0.97, ttl=600,
+                store=self.vs_manager.cache_store,
+                namespace=str(self.vs_manager.vectorstore._collection.id)
+            )
+        self._cache_revision = self.vs_manager.revision
+    
+    def _make_retriever(self, search_kwargs: Dict[str, any]) -> BaseRetriever:
+        """
+        Builds an MMR retriever over the vector store
+        
+        @params:
+            search_kwargs: MMR retriever search arguments (k, fetch_k, lambda_mult, filter)
+            
+        @returns:
+            BaseRetriever: Vector store retriever
+        """
+        return self.vs_manager.vectorstore.as_retriever(
+            search_type="mmr",
+            search_kwargs=search_kwargs
+        )
+    
+    def _build_chain(self, retriever: BaseRetriever,
+                     retriever_for: Optional[Callable[[str], BaseRetriever]] = None) -> ConversationalRetrievalChain:
+        """
+        Builds a conversational retrieval chain over the vector store; chains share the engine's LLMs and memory
+        
+        @params:
+            retriever: Retriever used for every question, unless retriever_for is given
+            retriever_for: Function picking the retriever from the question retrieval runs on
+            
+        @returns:
+            ConversationalRetrievalChain: Complete RAG pipeline chain
+        """
+        return _StandaloneAwareChain.from_llm(
             llm=self.llm,
-            retriever=self.vs_manager.vectorstore.as_retriever(
-                search_kwargs={"k": 15}                     # retrieve top 15 most relevant chunks
-            ),
+            retriever=retriever,
+            retriever_for=retriever_for,
             memory=self.memory,
+            condense_question_llm=self.condense_llm,
             return_source_documents=True,                   # include source docs for attribution
             combine_docs_chain_kwargs={"prompt": self.qa_prompt},
+            response_if_no_docs_found=NO_DOCS_ANSWER,       # no context retrieved: skip the answer LLM call
+            is_standalone=self._is_standalone,              # skip the question rewrite when not needed
             verbose=False
         )
     
+    def _is_standalone(self, question: str) -> bool:
+        """
+        Checks whether a question can be answered without rewriting it against the conversation history;
+        LangChain already skips the rewrite when the history is empty
+        
+        @params:
+            question: User's natural language question
+            
+        @returns:
+            bool: True if the question names a company, a year and what it asks about (a metric or query type),
+                and does not refer back to earlier turns
+        """
+        analysis = self.analyze_query_intent(question)
+        
+        if not analysis["companies"] or not analysis["years"]:
+            return False
+        
+        # e.g. "Tesla in 2022?" only makes sense with the metric of the previous turn
+        if not analysis["metrics"] and analysis["query_type"] not in QUERY_TYPE_PRIORITY:
+            return False
+        
+        return _FOLLOW_UP_RE.search(question) is None
+    
+    def _retriever_for(self, question: str) -> BaseRetriever:
+        """
+        Picks the retriever for the question retrieval runs on (the rewritten one for follow-ups, so
+        companies named in earlier turns are kept); questions naming specific companies get a retriever
+        pre-filtered to those companies, so MMR only diversifies over relevant chunks
+        
+        @params:
+            question: Standalone question passed to retrieval
+            
+        @returns:
+            BaseRetriever: Shared retriever, or a company-filtered one
+        """
+        companies = tuple(COMPANY_NAMES[c] for c in self.analyze_query_intent(question)["companies"])
+        return self._filtered_retriever(companies)
+    
+    def _filtered_retriever(self, companies: tuple = (), year: Optional[str] = None) -> BaseRetriever:
+        """
+        Returns the retriever restricted to the given companies and year; retrievers are built once per
+        filter and reused, so filtered queries never mutate a shared retriever
+        
+        @params:
+            companies: Company names as stored in the metadata; empty for no company filter
+            year: Report year; None for no year filter
+            
+        @returns:
+            BaseRetriever: Shared unfiltered retriever if no filter is given, else a filtered one
+        """
+        conditions = []
+        if len(companies) == 1:
+            conditions.append({"company": companies[0]})
+        elif companies:
+            conditions.append({"company": {"$in": list(companies)}})
+        if year:
+            conditions.append({"year": year})
+        
+        if not conditions:
+            return self._retriever
+        
+        key = (companies, year)
+        with self._filtered_lock:
+            retriever = self.filtered_retrievers.get(key)
+            if retriever is None:
+                # Chroma accepts a single condition per where clause; several are combined with $and
+                where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+                retriever = self._make_retriever({**self.search_kwargs, "filter": where})
+                self.filtered_retrievers[key] = retriever
+        
+        return retriever
+    
+    def _filtered_chain(self, companies: tuple = (), year: Optional[str] = None) -> ConversationalRetrievalChain:
+        """
+        Returns the chain whose retriever is fixed to the given companies and year
+        
+        @params:
+            companies: Company names as stored in the metadata; empty for no company filter
+            year: Report year; None for no year filter
+            
+        @returns:
+            ConversationalRetrievalChain: Shared chain if no filter is given, else a filtered one
+        """
+        if not companies and not year:
+            return self.qa_chain
+        
+        retriever = self._filtered_retriever(companies, year)
+        key = (companies, year)
+        with self._filtered_lock:
+            chain = self.filtered_chains.get(key)
+            if chain is None:
+                chain = self._build_chain(retriever)
+                self.filtered_chains[key] = chain
+        
+        return chain
+    
     def _create_qa_prompt(self) -> PromptTemplate:
         """
         Creates specialized prompt template optimized for financial data extraction
@@ -100,12 +558,13 @@ Provide a clear, specific answer with exact figures when available:"""
             input_variables=["context", "question"]
         )
     
-    def query(self, question: str) -> Dict[str, any]:
+    def query(self, question: str, return_sources: bool = True) -> Dict[str, any]:
         """
-        Executes a query using multi-strategy retrieval and answer generation
+        Answers a question from the semantic cache, or by retrieval and answer generation in one chain run
         
         @params:
             question: User's natural language question
+            return_sources: Whether to include the retrieved chunks; when False 'source_documents' is empty
             
         @returns:
             results: 
@@ -114,81 +573,222 @@ Provide a clear, specific answer with exact figures when available:"""
                     - 'source_documents' (List[Document]): Retrieved document chunks used
                     - 'success' (bool): Check whether query executed successfully
         """
-        results = self._multi_strategy_query(question)
+        results = self._answer(question)
         
-        return results
+        return results if return_sources else self._without_sources(results)
     
-    def _multi_strategy_query(self, question: str) -> Dict[str, any]:
+    async def aquery(self, question: str, return_sources: bool = True) -> Dict[str, any]:
         """
-        Tries multiple query strategies to maximize retrieval success
-        
-        Strategy 1: Try the original query unmodified
-        Strategy 2: Else, expand query with financial terminology synonyms
+        Async variant of query(); awaits the embedding, retrieval and LLM calls so concurrent queries overlap
+        their network latency
         
         @params:
-            question: Original user question
+            question: User's natural language question
+            return_sources: Whether to include the retrieved chunks (see query())
             
         @returns:
-            Query result dictionary with answer, sources, and success flag
+            results: Query result dictionary with answer, sources, success flag (see query())
         """
-        try:
-            result = self.qa_chain({"question": question})
+        results = await self._aanswer(question)
+        
+        return results if return_sources else self._without_sources(results)
+    
+    @staticmethod
+    def _without_sources(results: Dict[str, any]) -> Dict[str, any]:
+        """
+        Copies a query result without its source documents (the original may be held by the semantic cache)
+        """
+        return {**results, "source_documents": []}
+    
+    def query_stream(self, question: str) -> AnswerStream:
+        """
+        Executes a query like query(), but yields answer tokens as they are generated
+        
+        @params:
+            question: User's natural language question
             
-            answer = result["answer"].lower()
-            if "don't have that information" not in answer or len(result.get("source_documents", [])) > 0:
-                return {
-                    "answer": result["answer"],
-                    "source_documents": result.get("source_documents", []),
-                    "success": True
-                }
+        @returns:
+            stream: Iterable of answer tokens; stream.result holds the query result dictionary once exhausted
+        """
+        return AnswerStream(lambda callbacks: self._answer(question, callbacks=callbacks))
+    
+    def astream_query(self, question: str) -> AsyncAnswerStream:
+        """
+        Async variant of query_stream(); iterate with `async for` inside a running event loop
+        
+        @params:
+            question: User's natural language question
             
-            expanded_question = self._expand_financial_query(question)
-            if expanded_question != question:
-                print(f" Trying expanded query...")
-                result = self.qa_chain({"question": expanded_question})
-                
-                return {
-                    "answer": result["answer"],
-                    "source_documents": result.get("source_documents", []),
-                    "success": True
-                }
+        @returns:
+            stream: Async iterable of answer tokens; stream.result holds the query result dictionary once exhausted
+        """
+        return AsyncAnswerStream(lambda callbacks: self._aanswer(question, callbacks=callbacks))
+    
+    def _lookup_cache(self, question: str):
+        """
+        Embeds the question and looks it up in the semantic cache; the cache is dropped first if the
+        vector store changed since it was filled; only standalone questions are cached, since the answer
+        to a follow-up depends on the conversation it was asked in
+        
+        @params:
+            question: User's natural language question
             
-            return {
-                "answer": result["answer"],
-                "source_documents": result.get("source_documents", []),
-                "success": True
-            }
+        @returns:
+            (embedding, cached) tuple; embedding is None if caching is disabled, the question is not
+            standalone or embedding failed, cached is the cached result dictionary or None on a miss
+        """
+        if self.cache is None or not self._is_standalone(question):
+            return None, None
+        
+        self._check_cache_revision()
+        
+        try:
+            embedding = self.vs_manager.embeddings.embed_query(question)
+        except Exception:
+            # cache is best-effort; the query itself will surface real errors
+            return None, None
+        
+        return embedding, self.cache.lookup(embedding, key=self._cache_key(question))
+    
+    async def _alookup_cache(self, question: str):
+        """
+        Async variant of _lookup_cache()
+        """
+        if self.cache is None or not self._is_standalone(question):
+            return None, None
+        
+        self._check_cache_revision()
+        
+        try:
+            embedding = await self.vs_manager.embeddings.aembed_query(question)
+        except Exception:
+            return None, None
+        
+        return embedding, self.cache.lookup(embedding, key=self._cache_key(question))
+    
+    def _cache_key(self, question: str) -> str:
+        """
+        Builds the exact-match semantic cache key of a question from the companies, years and metrics it names
+        and its query type, so e.g. the 2022 and 2023 revenue questions (or the 2023 revenue and profit ones)
+        never share an answer however close their embeddings are
+        
+        @params:
+            question: User's natural language question
             
-        except Exception as e:
-            return {
-                "answer": f"Error processing query: {str(e)}",
-                "source_documents": [],
-                "success": False
-            }
+        @returns:
+            Key string such as "BMW,TESLA|2023|revenue|comparison"
+        """
+        analysis = self.analyze_query_intent(question)
+        return "|".join([
+            ",".join(sorted(analysis["companies"])),
+            ",".join(sorted(analysis["years"])),
+            ",".join(sorted(analysis["metrics"])),
+            analysis["query_type"]
+        ])
     
-    def _expand_financial_query(self, question: str) -> str:
+    def _check_cache_revision(self):
         """
-        Expands financial queries by appending synonym alternatives
+        Drops the semantic cache if the vector store changed since the cache was filled
+        """
+        if self._cache_revision != self.vs_manager.revision:
+            self.cache.clear()
+            self._cache_revision = self.vs_manager.revision
+    
+    def _answer(self, question: str,
+                callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, any]:
+        """
+        Answers from the semantic cache when possible, else runs the retrieval chain and caches the result
         
         @params:
             question: Original user question
+            callbacks: Callback handlers for the chain run (e.g. token streaming)
             
         @returns:
-            expanded: Expanded question with synonyms appended (or original if no expansion needed)
+            Query result dictionary with answer, sources, and success flag
         """
-        expansions = {
-            "revenue": "revenue total sales net sales turnover",
-            "profit": "profit net income earnings EBIT EBITDA net profit",
-            "growth": "growth increase change trend performance",
-        }
+        embedding, cached = self._lookup_cache(question)
         
-        expanded = question
-        for term, alternatives in expansions.items():
-            if term in question.lower():
-                expanded = question + f" (including {alternatives})"
-                break
+        if cached is not None:
+            # keep the conversation history consistent with what the user was shown
+            self.memory.save_context({"question": question}, {"answer": cached["answer"]})
+            return cached
+        
+        result = self._run_chain(question, callbacks=callbacks)
+        
+        if embedding is not None and result["success"]:
+            self.cache.add(embedding, result, key=self._cache_key(question))
+        
+        return result
+    
+    async def _aanswer(self, question: str,
+                       callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, any]:
+        """
+        Async variant of _answer()
+        """
+        embedding, cached = await self._alookup_cache(question)
+        
+        if cached is not None:
+            self.memory.save_context({"question": question}, {"answer": cached["answer"]})
+            return cached
+        
+        result = await self._arun_chain(question, callbacks=callbacks)
+        
+        if embedding is not None and result["success"]:
+            self.cache.add(embedding, result, key=self._cache_key(question))
+        
+        return result
+    
+    def _run_chain(self, question: str,
+                   callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, any]:
+        """
+        Runs the question through the retrieval chain (company-filtered when the retrieval question names companies);
+        a retrieval that finds no documents is answered without an LLM call
         
-        return expanded
+        @params:
+            question: Original user question
+            callbacks: Callback handlers for the chain run (e.g. token streaming)
+            
+        @returns:
+            Query result dictionary with answer, sources, and success flag
+        """
+        try:
+            result = self.qa_chain({"question": question}, callbacks=callbacks)
+            return self._success_result(result)
+            
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def _arun_chain(self, question: str,
+                          callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, any]:
+        """
+        Async variant of _run_chain()
+        """
+        try:
+            result = await self.qa_chain.ainvoke({"question": question}, config={"callbacks": callbacks})
+            return self._success_result(result)
+            
+        except Exception as e:
+            return self._error_result(e)
+    
+    def _success_result(self, result: Dict[str, any]) -> Dict[str, any]:
+        """
+        Converts raw chain output into the engine's query result dictionary
+        """
+        return {
+            "answer": result["answer"],
+            "source_documents": result.get("source_documents", []),
+            "success": True
+        }
+    
+    def _error_result(self, error: Exception) -> Dict[str, any]:
+        """
+        Builds the query result dictionary for a failed query
+        """
+        return {
+            "answer": f"Error processing query: {str(error)}",
+            "source_documents": [],
+            "success": False
+        }
     
     def query_with_filter(self, question: str, company: Optional[str] = None, 
                          year: Optional[str] = None) -> Dict[str, any]:
@@ -203,40 +803,38 @@ Provide a clear, specific answer with exact figures when available:"""
         @returns:
             Query result dictionary with answer, sources, success flag
         """
-        # build metadata filter dictionary
-        filter_dict = {}
-        if company:
-            filter_dict["company"] = company
-        if year:
-            filter_dict["year"] = year
+        chain = self._filtered_chain((company,) if company else (), year)
         
-        if filter_dict:
-            original_search_kwargs = self.qa_chain.retriever.search_kwargs
-            self.qa_chain.retriever.search_kwargs = {
-                "k": 15,
-                "filter": filter_dict
-            }
+        try:
+            result = chain({"question": question})
+            return self._success_result(result)
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def aquery_with_filter(self, question: str, company: Optional[str] = None,
+                                 year: Optional[str] = None) -> Dict[str, any]:
+        """
+        Async variant of query_with_filter()
+        
+        @params:
+            question: User's natural language question
+            company: Filter to specific company 
+            year: Filter to specific year
+            
+        @returns:
+            Query result dictionary with answer, sources, success flag
+        """
+        chain = self._filtered_chain((company,) if company else (), year)
         
         try:
-            result = self.qa_chain({"question": question})
-            return {
-                "answer": result["answer"],
-                "source_documents": result.get("source_documents", []),
-                "success": True
-            }
+            result = await chain.ainvoke({"question": question})
+            return self._success_result(result)
         except Exception as e:
-            return {
-                "answer": f"Error processing query: {str(e)}",
-                "source_documents": [],
-                "success": False
-            }
-        finally:
-            if filter_dict:
-                self.qa_chain.retriever.search_kwargs = original_search_kwargs
+            return self._error_result(e)
     
     def get_conversation_history(self) -> List[Dict[str, str]]:
         """
-        Retrieve the current conversation history
+        Retrieve the current conversation history (all turns, including those outside the memory window)
         
         @returns:
             history: 
@@ -244,24 +842,22 @@ Provide a clear, specific answer with exact figures when available:"""
                     - 'role' (str): Message role ('human' or 'ai')
                     - 'content' (str): Message content text
         """
-        messages = self.memory.chat_memory.messages
-        history = []
-        
         # convert message objects to dictionaries
-        for msg in messages:
-            if hasattr(msg, 'type'):
-                history.append({
-                    "role": msg.type,
-                    "content": msg.content
-                })
+        history = [
+            {"role": role, "content": msg.content}
+            for msg in self.memory.chat_memory.messages
+            if (role := getattr(msg, "type", None)) is not None
+        ]
         
         return history
     
     def clear_history(self):
         """
-        Clear the conversation history from memory
+        Clear the conversation history from memory (and the semantic cache built on it)
         """
         self.memory.clear()
+        if self.cache is not None:
+            self.cache.clear()
     
     def format_sources(self, source_documents: List[Document]) -> str:
         """
@@ -276,30 +872,22 @@ Provide a clear, specific answer with exact figures when available:"""
         if not source_documents:
             return "No sources available"
         
-        sources_text = "\n\nSources:\n"
-        sources_text += "=" * 60 + "\n"
-        
-        sources_by_company = {}
+        # chunk counts per (company, year); the file shown is the first one seen for that key
+        counts = Counter()
+        files = {}
         for doc in source_documents:
-            company = doc.metadata.get("company", "Unknown")
-            year = doc.metadata.get("year", "Unknown")
-            source = doc.metadata.get("source_file", "Unknown")
-            
-            key = f"{company} - {year}"
-            if key not in sources_by_company:
-                sources_by_company[key] = {
-                    "company": company,
-                    "year": year,
-                    "source": source,
-                    "count": 0
-                }
-            sources_by_company[key]["count"] += 1
-        
-        for i, (key, info) in enumerate(sources_by_company.items(), 1):
-            sources_text += f"{i}. {info['company']} Annual Report {info['year']}\n"
-            sources_text += f"   File: {info['source']}\n"
-            sources_text += f"   Chunks referenced: {info['count']}\n"
-        
+            key = (doc.metadata.get("company", "Unknown"), doc.metadata.get("year", "Unknown"))
+            counts[key] += 1
+            files.setdefault(key, doc.metadata.get("source_file", "Unknown"))
+        
+        lines = [
+            f"{i}. {company} Annual Report {year}\n"
+            f"   File: {files[(company, year)]}\n"
+            f"   Chunks referenced: {count}\n"
+            for i, ((company, year), count) in enumerate(counts.items(), 1)
+        ]
+        
+        sources_text = "\n\nSources:\n" + "=" * 60 + "\n" + "".join(lines)
         return sources_text
     
     def analyze_query_intent(self, question: str) -> Dict[str, any]:
@@ -317,42 +905,21 @@ Provide a clear, specific answer with exact figures when available:"""
                     - 'metrics' (List[str]): Detected metric types
                     - 'query_type' (str): Classified query type
         """
-        question_lower = question.lower()
+        # one automaton pass collects every keyword bucket the question hits
+        matched, years = _scan_question(question)
         
         analysis = {
-            "companies": [],
-            "years": [],
-            "metrics": [],
+            # keep the declaration order of INTENT_KEYWORDS for companies and metrics
+            "companies": [value for bucket, value in INTENT_KEYWORDS if bucket == "company" and (bucket, value) in matched],
+            "years": list(years),
+            "metrics": [value for bucket, value in INTENT_KEYWORDS if bucket == "metric" and (bucket, value) in matched],
             "query_type": "general"
         }
         
-        companies = ["bmw", "tesla", "ford"]
-        for company in companies:
-            if company in question_lower:
-                analysis["companies"].append(company.upper())
-        
-        import re
-        years = re.findall(r'20[2-4][0-9]', question)
-        analysis["years"] = list(set(years))  
-        
-        metrics = {
-            "revenue": ["revenue", "sales", "turnover"],
-            "profit": ["profit", "earnings", "net income", "ebitda", "ebit"],
-            "growth": ["growth", "increase", "trend"],
-            "performance": ["performance", "results"]
-        }
-        
-        for metric_name, keywords in metrics.items():
-            if any(keyword in question_lower for keyword in keywords):
-                analysis["metrics"].append(metric_name)
-        
         # classify query type based on keywords and entity patterns
-        if "compare" in question_lower or "between" in question_lower or "versus" in question_lower:
-            analysis["query_type"] = "comparison"
-        elif "trend" in question_lower or "over" in question_lower or "growth" in question_lower:
-            analysis["query_type"] = "trend"
-        elif "summary" in question_lower or "overview" in question_lower:
-            analysis["query_type"] = "summary"
+        query_types = [qt for qt in QUERY_TYPE_PRIORITY if ("query_type", qt) in matched]
+        if query_types:
+            analysis["query_type"] = query_types[0]
         elif len(analysis["companies"]) == 1 and len(analysis["years"]) == 1:
             analysis["query_type"] = "specific"
         
@@ -369,16 +936,23 @@ if __name__ == "__main__":
         vs_manager = VectorStoreManager()
         vs_manager.load_vectorstore()
         
+        install_llm_cache()
         rag = RAGEngine(vs_manager)
         
         test_question = "What was BMW's revenue in 2023?"
         print(f"\nQuestion: {test_question}")
         print("-" * 60)
         
-        result = rag.query(test_question)
+        # print tokens as they arrive instead of waiting for the full answer
+        stream = rag.query_stream(test_question)
+        print("Answer: ", end="", flush=True)
+        for token in stream:
+            print(token, end="", flush=True)
+        
+        result = stream.result
         
         if result["success"]:
-            print(f"Answer: {result['answer']}")
+            print()
             print(rag.format_sources(result['source_documents']))
         else:
             print(f"Error: {result['answer']}")
@@ -0,0 +1,188 @@
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+
+# package import (import src) or script import (src/ on sys.path)
+try:
+    from .cache_store import CacheStore
+except ImportError:
+    from cache_store import CacheStore
+
+
+class SemanticCache:
+    """
+    Class defining the behaviour of the semantic response cache;
+    maps query embeddings to previously computed results and serves near-duplicate queries by cosine similarity;
+    entries only match queries with the same key (e.g. the companies and years asked about), since embeddings of
+    questions differing in just an entity are very close (thread-safe, with LRU eviction, optional time-to-live
+    and optional persistence)
+    """
+
+    def __init__(self, max_size: int = 500, threshold: float = 0.97, ttl: Optional[float] = 600,
+                 store: Optional[CacheStore] = None, namespace: str = ""):
+        """
+        Constructor to initialize an empty semantic cache
+
+        @params:
+            max_size: Max num of cached entries; the least recently used entry is evicted once full
+            threshold: Min cosine similarity between query embeddings for a cache hit
+            ttl: Seconds an entry stays valid after insertion; None keeps entries until evicted
+            store: Persistent store; live entries are reloaded from it and new entries written to it
+            namespace: Store namespace of this cache's entries (e.g. the id of the vector store they came from)
+
+        @attributes:
+            max_size: Configured capacity
+            threshold: Configured similarity threshold
+            ttl: Configured time-to-live
+            matrix: L2-normalized query embeddings, one row per slot; allocated on first insert
+            results: Cached result dictionaries, parallel to the rows of matrix
+            keys: Exact-match keys of the entries, parallel to the rows of matrix
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.matrix: Optional[np.ndarray] = None
+        self.results: List[Optional[Dict]] = [None] * max_size
+        self.keys = np.full(max_size, None, dtype=object)
+        self._inserted_at = np.full(max_size, -np.inf)
+        self._used_at = np.full(max_size, -np.inf)
+        self._scores = np.empty(max_size, dtype=np.float32)   # reused similarity buffer for lookups
+        self._lock = threading.RLock()
+        self._store = store
+        self._namespace = namespace
+
+        if store is not None:
+            self._load_from_store()
+
+
+    def _load_from_store(self):
+        """
+        Refills the cache with the most recent unexpired entries of the persistent store
+        """
+        since = time.time() - self.ttl if self.ttl is not None else -np.inf
+        answers = self._store.load_answers(self._namespace, since)[-self.max_size:]
+
+        if not answers:
+            return
+
+        self.matrix = np.zeros((self.max_size, answers[0][0].shape[0]), dtype=np.float32)
+        for slot, (embedding, key, result, ts) in enumerate(answers):
+            self.matrix[slot] = embedding
+            self.results[slot] = result
+            self.keys[slot] = key
+            self._inserted_at[slot] = ts
+            self._used_at[slot] = ts
+
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """
+        Converts an embedding into a unit-length float32 vector so a dot product equals cosine similarity
+
+        @params:
+            embedding: Raw embedding vector
+
+        @returns:
+            vec: Normalized numpy vector
+        """
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+
+    def _valid_slots(self, now: float) -> np.ndarray:
+        """
+        Computes which slots hold a live (inserted and not expired) entry
+
+        @params:
+            now: Current time in seconds
+
+        @returns:
+            Boolean mask over the slots
+        """
+        if self.ttl is None:
+            return np.isfinite(self._inserted_at)
+        return self._inserted_at > now - self.ttl
+
+
+    def lookup(self, embedding: List[float], key: str = "") -> Optional[Dict]:
+        """
+        Finds the cached result whose query is most similar to the given embedding
+
+        @params:
+            embedding: Embedding of the incoming query
+            key: Exact-match key of the query; only entries stored under the same key are considered
+
+        @returns:
+            The cached result dictionary if the best similarity reaches the threshold, else None
+        """
+        with self._lock:
+            if self.matrix is None:
+                return None
+
+            now = time.time()
+            valid = self._valid_slots(now) & (self.keys == key)
+            if not valid.any():
+                return None
+
+            # similarities of all slots written into the preallocated buffer, dead slots masked in place
+            scores = np.matmul(self.matrix, self._normalize(embedding), out=self._scores)
+            np.copyto(scores, -np.inf, where=~valid)
+            best = int(np.argmax(scores))
+
+            if scores[best] < self.threshold:
+                return None
+
+            self._used_at[best] = now
+            return self.results[best]
+
+
+    def add(self, embedding: List[float], result: Dict, key: str = ""):
+        """
+        Stores a result under its query embedding; reuses a free/expired slot, else evicts the LRU entry
+
+        @params:
+            embedding: Embedding of the query that produced the result
+            result: Result dictionary to replay on later hits
+            key: Exact-match key of the query (see lookup())
+        """
+        vec = self._normalize(embedding)
+
+        with self._lock:
+            if self.matrix is None:
+                self.matrix = np.zeros((self.max_size, vec.shape[0]), dtype=np.float32)
+
+            now = time.time()
+            free = np.flatnonzero(~self._valid_slots(now))
+            slot = int(free[0]) if free.size else int(np.argmin(self._used_at))
+
+            self.matrix[slot] = vec
+            self.results[slot] = result
+            self.keys[slot] = key
+            self._inserted_at[slot] = now
+            self._used_at[slot] = now
+
+        if self._store is not None:
+            query_hash = hashlib.sha1(key.encode() + vec.tobytes()).hexdigest()
+            self._store.put_answer(self._namespace, query_hash, vec, key, result, now)
+
+
+    def clear(self):
+        """
+        Removes all cached entries
+        """
+        with self._lock:
+            self.results = [None] * self.max_size
+            self.keys.fill(None)
+            self._inserted_at.fill(-np.inf)
+            self._used_at.fill(-np.inf)
+
+        if self._store is not None:
+            self._store.clear_answers(self._namespace)
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._valid_slots(time.time()).sum())
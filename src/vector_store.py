@@ -1,13 +1,221 @@
+import asyncio
 import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
+import openai
+from langchain.embeddings import CacheBackedEmbeddings
 from langchain.schema import Document
+from langchain.storage import LocalFileStore
+from langchain_core.pydantic_v1 import PrivateAttr
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from dotenv import load_dotenv
+from tqdm import tqdm
+
+# package import (import src) or script import (src/ on sys.path)
+try:
+    from .cache_store import CacheStore
+except ImportError:
+    from cache_store import CacheStore
 
 load_dotenv()
 
+# max concurrent embedding requests per OpenAI usage tier (OPENAI_USAGE_TIER)
+TIER_CONCURRENCY = {"free": 1, "tier1": 35, "tier2": 50, "tier3": 75, "tier4": 125, "tier5": 150}
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class RateLimitedOpenAIEmbeddings(OpenAIEmbeddings):
+    """
+    Class defining OpenAI embeddings with client-side throttling;
+    caps concurrent requests with a shared semaphore and retries rate-limited/transient failures
+    with exponential backoff, honoring OpenAI's Retry-After header
+    """
+    
+    max_concurrent: int = TIER_CONCURRENCY["tier1"]
+    max_tries: int = 8
+    _semaphore: threading.Semaphore = PrivateAttr()
+    
+    def __init__(self, **kwargs):
+        """
+        Constructor to initialize the embeddings client
+        
+        @params:
+            kwargs: OpenAIEmbeddings fields, plus max_concurrent and max_tries
+        """
+        # the retries below replace the OpenAI client's own retry policy
+        kwargs.setdefault("max_retries", 0)
+        super().__init__(**kwargs)
+        self._semaphore = threading.Semaphore(max(1, self.max_concurrent))
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Computes how long to wait before retrying a failed request
+        
+        @params:
+            error: Exception raised by the OpenAI client
+            attempt: Zero-based num of the failed attempt
+            
+        @returns:
+            Delay in seconds; the server's Retry-After value if given, else exponential backoff with jitter
+        """
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            pass
+        
+        return min(2 ** attempt, 60) + random.uniform(0, 1)
+    
+    def embed_documents(self, texts: List[str], chunk_size: Optional[int] = 0) -> List[List[float]]:
+        """
+        Embeds texts (see OpenAIEmbeddings.embed_documents), throttled and retried
+        """
+        for attempt in range(self.max_tries):
+            try:
+                with self._semaphore:
+                    return super().embed_documents(texts, chunk_size=chunk_size)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_tries - 1:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                print(f" Embedding request failed ({type(e).__name__}); retrying in {delay:.1f}s...")
+                time.sleep(delay)
+    
+    async def aembed_documents(self, texts: List[str], chunk_size: Optional[int] = 0) -> List[List[float]]:
+        """
+        Async variant of embed_documents(); retried the same way (the thread semaphore is not used
+        so the event loop never blocks)
+        """
+        for attempt in range(self.max_tries):
+            try:
+                return await super().aembed_documents(texts, chunk_size=chunk_size)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_tries - 1:
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt))
+
+
+class QueryCachedEmbeddings(CacheBackedEmbeddings):
+    """
+    Class defining cache-backed embeddings that also cache queries;
+    document embeddings are persisted in a byte store (see CacheBackedEmbeddings), query embeddings
+    are kept in an in-memory LRU so identical query strings skip the embedding API round trip
+    """
+    
+    max_queries = 256
+    
+    def __init__(self, underlying_embeddings, document_embedding_store):
+        """
+        Constructor to initialize the embeddings wrapper
+        
+        @params:
+            underlying_embeddings: Embedding model computing cache misses
+            document_embedding_store: Store caching document embeddings
+        """
+        super().__init__(underlying_embeddings, document_embedding_store)
+        self._queries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._store: Optional[CacheStore] = None
+        self._model = ""
+    
+    def attach_store(self, store: CacheStore, model: str):
+        """
+        Persists the query LRU in a cache store; the most recent stored queries of the model are loaded
+        right away, later cache misses are written back
+        
+        @params:
+            store: Persistent cache store
+            model: Name of the embedding model; vectors of other models are never loaded
+        """
+        with self._lock:
+            for text, embedding in store.load_query_embeddings(model, self.max_queries):
+                self._queries[text] = embedding
+            self._store = store
+            self._model = model
+    
+    def _get_query(self, text: str) -> Optional[List[float]]:
+        """
+        Returns the cached embedding of a query string (marking it recently used), None if not cached
+        """
+        with self._lock:
+            embedding = self._queries.get(text)
+            if embedding is not None:
+                self._queries.move_to_end(text)
+            return embedding
+    
+    def _put_query(self, text: str, embedding: List[float]):
+        """
+        Caches the embedding of a query string; evicts the least recently used query once full
+        """
+        with self._lock:
+            self._queries[text] = embedding
+            self._queries.move_to_end(text)
+            if len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+            store = self._store
+        
+        if store is not None:
+            store.put_query_embedding(self._model, text, embedding, time.time())
+    
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds query text, served from the query LRU when the same string was embedded before
+        """
+        embedding = self._get_query(text)
+        if embedding is None:
+            embedding = self.underlying_embeddings.embed_query(text)
+            self._put_query(text, embedding)
+        return embedding
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds several query texts; those not in the query LRU are embedded together in one API request
+        
+        @params:
+            texts: Query texts to embed
+            
+        @returns:
+            One embedding vector per text, in the same order as texts
+        """
+        embeddings = [self._get_query(text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            computed = self.underlying_embeddings.embed_documents([texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                self._put_query(texts[i], embedding)
+        
+        return embeddings
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Async variant of embed_query(); uses the underlying model's async client on cache misses
+        """
+        embedding = self._get_query(text)
+        if embedding is None:
+            embedding = await self.underlying_embeddings.aembed_query(text)
+            self._put_query(text, embedding)
+        return embedding
+
 
 class VectorStoreManager:
     """
@@ -15,34 +223,73 @@ class VectorStoreManager:
     (for vector embeddings and retrieval operations using ChromaDB)
     """
     
-    def __init__(self, persist_directory: str = "data/processed/chroma_db"):
+    def __init__(self, persist_directory: str = "data/processed/chroma_db",
+                 embedding_cache_dir: str = "data/cache/embeddings",
+                 query_cache_path: Optional[str] = "data/cache/query_cache.sqlite"):
         """
         Constructor to initialize the vector store manager with persistence configuration
         
         @params:
             persist_directory: Path where ChromaDB will store its database files
+            embedding_cache_dir: Path where computed document embeddings are cached (reused on re-runs)
+            query_cache_path: SQLite file persisting query embeddings and cached answers; None keeps them in memory only
         
         @attributes:
             persist_directory: Resolved path to the persistence directory
-            embeddings: OpenAI embedding model instance for text-to-vector conversion
+            embeddings: OpenAI embedding model for text-to-vector conversion, wrapped with document/query caches
+            cache_store: Persistent store for the query caches, None if disabled
             vectorstore: ChromaDB vector store instance, None until loaded or created
+            collection_metadata: HNSW index settings applied when a new collection is created
+            revision: Counter bumped whenever the stored documents change (lets caches detect stale entries)
+            max_concurrent_batches: Num of embedding requests kept in flight while building the store
         """
         self.persist_directory = Path(persist_directory)
         self.persist_directory.mkdir(parents=True, exist_ok=True)
         
-        # initialize OpenAI embeddings model (text-embedding-ada-002 produces 1536-dim vectors)
-        self.embeddings = OpenAIEmbeddings(
-            model=os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+        # initialize OpenAI embeddings model (text-embedding-ada-002 produces 1536-dim vectors);
+        # concurrency is capped according to the account's usage tier
+        tier = os.getenv("OPENAI_USAGE_TIER", "tier1").lower()
+        model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+        openai_embeddings = RateLimitedOpenAIEmbeddings(
+            model=model,
+            max_concurrent=TIER_CONCURRENCY.get(tier, TIER_CONCURRENCY["tier1"])
+        )
+        
+        # already embedded chunks are read from disk, so a re-run after a failed ingest only pays for the rest
+        self.embeddings = QueryCachedEmbeddings.from_bytes_store(
+            openai_embeddings,
+            LocalFileStore(str(embedding_cache_dir)),
+            namespace=model
         )
         
-        self.vectorstore: Optional[Chroma] = None
+        # query embeddings (and the RAG engine's cached answers) survive restarts
+        self.cache_store = CacheStore(query_cache_path) if query_cache_path else None
+        if self.cache_store is not None:
+            self.embeddings.attach_store(self.cache_store, model)
+        
+        self._vectorstore: Optional[Chroma] = None
+        self._load_future: Optional[Future] = None
+        self.revision = 0
+        
+        # Chroma indexes with HNSW; cosine distance matches how the embeddings are compared,
+        # construction_ef/M set graph quality at build time, search_ef the candidate list width per query
+        self.collection_metadata = {
+            "hnsw:space": "cosine",
+            "hnsw:construction_ef": int(os.getenv("HNSW_CONSTRUCTION_EF", "200")),
+            "hnsw:search_ef": int(os.getenv("HNSW_SEARCH_EF", "80")),
+            "hnsw:M": int(os.getenv("HNSW_M", "32"))
+        }
+        
+        # embedding requests are network-bound, so a few can overlap; raise for higher OpenAI usage tiers
+        self.max_concurrent_batches = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "5"))
     
-    def create_vectorstore(self, documents: List[Document]) -> Chroma:
+    def create_vectorstore(self, documents: List[Document], batch_size: int = 100) -> Chroma:
         """
         Creates a new vector store from document collection with batch processing
         
         @params:
             documents: List of LangChain Document objects to embed
+            batch_size: Num of documents embedded per embedding API request
             
         @returns:
             Initialized ChromaDB vector store with all documents embedded
@@ -54,38 +301,36 @@ class VectorStoreManager:
         print("This may take a few minutes...")
         
         try:
-            batch_size = 100
+            # start from an empty collection and fill it batch by batch
+            self.vectorstore = Chroma(
+                collection_name="automotive_reports",
+                embedding_function=self.embeddings,
+                persist_directory=str(self.persist_directory),
+                collection_metadata=self.collection_metadata
+            )
             
-            if len(documents) > batch_size:
-                print(f"Processing in batches of {batch_size} to avoid API limits...")
-                
-                # initialize vector store with first batch
-                first_batch = documents[:batch_size]
-                total_batches = (len(documents) + batch_size - 1) // batch_size
-                print(f"  Processing batch 1/{total_batches}...")
-                
-                self.vectorstore = Chroma.from_documents(
-                    documents=first_batch,
-                    embedding=self.embeddings,
-                    persist_directory=str(self.persist_directory),
-                    collection_name="automotive_reports"
-                )
-                
-                for i in range(batch_size, len(documents), batch_size):
-                    batch_num = (i // batch_size) + 1
-                    print(f"  Processing batch {batch_num}/{total_batches}...")
-                    
-                    batch = documents[i:i + batch_size]
-                    self.vectorstore.add_documents(batch)
+            batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+            print(f"Processing in {len(batches)} batch(es) of up to {batch_size}, "
+                  f"{self.max_concurrent_batches} in flight...")
+            
+            # embed batches concurrently, but write them to the collection in order from this thread
+            with ThreadPoolExecutor(max_workers=max(1, self.max_concurrent_batches)) as executor:
+                futures = [
+                    executor.submit(self._embed_batch, [doc.page_content for doc in batch], True)
+                    for batch in batches
+                ]
                 
-            else:
-                # small dataset, process all documents at once
-                self.vectorstore = Chroma.from_documents(
-                    documents=documents,
-                    embedding=self.embeddings,
-                    persist_directory=str(self.persist_directory),
-                    collection_name="automotive_reports"
-                )
+                try:
+                    for batch, future in tqdm(zip(batches, futures), total=len(batches), desc="Embedding batches"):
+                        self._add_embedded(
+                            [doc.page_content for doc in batch],
+                            [doc.metadata for doc in batch],
+                            future.result()
+                        )
+                except BaseException:
+                    # fail fast: drop the batches not started yet instead of embedding the rest of the corpus
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
             
             print(f" Vector store created successfully")
             print(f" Persisted to: {self.persist_directory}")
@@ -96,36 +341,140 @@ class VectorStoreManager:
             print(f" Error creating vector store: {str(e)}")
             raise
     
+    def add_texts_batch(self, texts: List[str], metadatas: List[dict]) -> List[str]:
+        """
+        Embeds a batch of texts with a single embedding API request and adds them to the vector store
+        
+        @params:
+            texts: Chunk texts to embed and store
+            metadatas: Metadata dictionaries, one per text
+            
+        @returns:
+            ids: Generated ids of the stored chunks
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store not initialized. Call load_vectorstore() or create_vectorstore() first.")
+        
+        return self._add_embedded(texts, metadatas, self._embed_batch(texts))
+    
+    def _embed_batch(self, texts: List[str], jitter_start: bool = False) -> List[List[float]]:
+        """
+        Embeds texts with one API request (throttling and retries are handled by the embeddings client)
+        
+        @params:
+            texts: Texts to embed
+            jitter_start: Whether to wait a short random delay first (spreads out concurrently started batches)
+            
+        @returns:
+            One embedding vector per text
+        """
+        if jitter_start:
+            time.sleep(random.uniform(0, 0.5))
+        
+        return self.embeddings.embed_documents(texts)
+    
+    def _add_embedded(self, texts: List[str], metadatas: List[dict], embeddings: List[List[float]]) -> List[str]:
+        """
+        Writes already embedded texts to the vector store collection
+        
+        @params:
+            texts: Chunk texts
+            metadatas: Metadata dictionaries, one per text
+            embeddings: Embedding vectors, one per text
+            
+        @returns:
+            ids: Generated ids of the stored chunks
+        """
+        ids = [str(uuid.uuid4()) for _ in texts]
+        
+        self.vectorstore._collection.add(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas
+        )
+        self.revision += 1
+        
+        return ids
+    
+    @property
+    def vectorstore(self) -> Optional[Chroma]:
+        """
+        ChromaDB vector store instance, None until loaded or created; waits for a pending background load
+        (see preload_vectorstore()) and re-raises its error
+        """
+        if self._load_future is not None:
+            future, self._load_future = self._load_future, None
+            self._vectorstore = future.result()
+        return self._vectorstore
+    
+    @vectorstore.setter
+    def vectorstore(self, value: Optional[Chroma]):
+        self._load_future = None
+        self._vectorstore = value
+    
+    def preload_vectorstore(self):
+        """
+        Starts loading the persisted vector store in a background thread and returns immediately, so the
+        disk I/O overlaps with other startup work (e.g. LLM client setup); the first access to
+        vectorstore waits for the load to finish
+        """
+        if self._load_future is not None or self._vectorstore is not None:
+            return
+        
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._load_future = executor.submit(self._open_vectorstore)
+        executor.shutdown(wait=False)
+    
     def load_vectorstore(self) -> Chroma:
         """
         Loads an existing vector store from disk; initializes ChromaDB with previously persisted embeddings
+        (joins a background load started by preload_vectorstore() instead of loading twice)
 
         @returns:
             Loaded ChromaDB vector store ready for search operations
         """
+        if self._load_future is not None:
+            return self.vectorstore
+        
+        self.vectorstore = self._open_vectorstore()
+        return self.vectorstore
+    
+    def _open_vectorstore(self) -> Chroma:
+        """
+        Opens the persisted ChromaDB collection, verifies it contains documents and warms up its search index
+        
+        @returns:
+            Loaded ChromaDB vector store
+        """
         print("\n" + "="*60)
         print("LOADING VECTOR STORE")
         print("="*60)
         
         try:
             # initialize ChromaDB client pointing to persisted directory
-            self.vectorstore = Chroma(
+            vectorstore = Chroma(
                 persist_directory=str(self.persist_directory),
                 embedding_function=self.embeddings,
                 collection_name="automotive_reports"
             )
             
             # verify store contains documents
-            collection = self.vectorstore._collection
+            collection = vectorstore._collection
             count = collection.count()
             
             if count == 0:
                 raise ValueError("Vector store is empty. Please create a new one.")
             
+            # search once with a stored embedding so the HNSW index is loaded into memory here rather than
+            # on the first user query (no embedding API call needed)
+            sample = collection.peek(limit=1)["embeddings"][0]
+            collection.query(query_embeddings=[sample], n_results=1, include=[])
+            
             print(f" Vector store loaded successfully")
             print(f" Contains {count} document chunks")
             
-            return self.vectorstore
+            return vectorstore
             
         except Exception as e:
             print(f" Error loading vector store: {str(e)}")
@@ -189,6 +538,45 @@ class VectorStoreManager:
         
         return results
     
+    def search_batch(self, queries: List[str], k: int = 4, filter_dict: Optional[dict] = None) -> List[List[Document]]:
+        """
+        Searches for several queries at once; all uncached queries are embedded in a single embedding API
+        request, and all query vectors are looked up in a single collection query
+        
+        @params:
+            queries: List of natural language search queries
+            k: Number of top results to return per query
+            filter_dict: Metadata filters to apply to every query
+            
+        @returns:
+            results: One list of k most similar Document objects per query, in the same order as queries
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store not initialized. Call load_vectorstore() or create_vectorstore() first.")
+        
+        if not queries:
+            return []
+        
+        query_embeddings = self.embeddings.embed_queries(queries)
+        
+        raw = self.vectorstore._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where=filter_dict or None,
+            include=["documents", "metadatas"]
+        )
+        
+        # the collection returns one list per query for each included field
+        results = [
+            [
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(texts, metadatas)
+            ]
+            for texts, metadatas in zip(raw["documents"], raw["metadatas"])
+        ]
+        
+        return results
+    
     def search_with_score(self, query: str, k: int = 4) -> List[tuple]:
         """
         Searches for documents with similarity scores included
@@ -198,7 +586,7 @@ class VectorStoreManager:
             k: Number of top results to return
             
         Returns:
-            results: List of (Document, score) tuples, where score is a float representing cosine similarity
+            results: List of (Document, score) tuples, where score is a float representing cosine distance (lower is closer)
         """
         if self.vectorstore is None:
             raise ValueError("Vector store not initialized.")
@@ -215,6 +603,7 @@ class VectorStoreManager:
             shutil.rmtree(self.persist_directory)
             print(f" Deleted vector store at {self.persist_directory}")
         self.vectorstore = None
+        self.revision += 1
 
 
 if __name__ == "__main__":
@@ -1,19 +1,83 @@
+import asyncio
+import re
 import sys
+from functools import lru_cache
 from pathlib import Path
 from colorama import Fore, Style, init
 
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from vector_store import VectorStoreManager
-from rag_engine import RAGEngine
+from rag_engine import RAGEngine, install_llm_cache
 from chat_interface import ChatInterface
 
 init(autoreset=True)
 
+# marker of answers the engine could not ground in the reports
+_NO_DATA_RE = re.compile(r"don't have that information", re.IGNORECASE)
 
-def run_test_queries():
+# separator lines
+_SEP = Fore.CYAN + "=" * 70
+_NL_SEP = "\n" + _SEP + "\n"
+
+# output blocks of the test run, each emitted with a single write
+_QUERY_BANNER = f"{_NL_SEP}{Fore.CYAN}Query {{i}}/{{n}}\n{_SEP}\n\n{Fore.CYAN}Question: {Fore.WHITE}{{question}}\n"
+_SUMMARY_BANNER = f"{_NL_SEP}{Fore.CYAN}TEST SUMMARY\n{_SEP}\n\n"
+
+
+@lru_cache(maxsize=1)
+def get_rag_system():
+    """
+    Initializes the RAG system once per process; later calls (e.g. running both modes) reuse it
+    
+    @returns:
+        (vs_manager, rag, chat) tuple of the loaded vector store manager, RAG engine and chat interface
+    """
+    vs_manager = VectorStoreManager()
+    vs_manager.load_vectorstore()
+    install_llm_cache()
+    rag = RAGEngine(vs_manager)
+    chat = ChatInterface(rag)
+    return vs_manager, rag, chat
+
+
+async def _run_all(rag: RAGEngine, questions: list, max_concurrency: int) -> list:
     """
-    Runs all test queries (from the sample questions provided)
+    Answers the questions concurrently on the event loop
+    
+    @params:
+        rag: Shared RAG engine; the extra engines of the pool reuse its semantic cache
+        questions: Questions to answer
+        max_concurrency: Max num of questions in flight
+        
+    @returns:
+        List of query result dictionaries, in question order
+    """
+    # conversation memory is per engine, so each in-flight question borrows its own engine from a pool
+    # and starts with an empty history; all engines share one semantic cache, so answers also serve the demo
+    engines = asyncio.Queue()
+    engines.put_nowait(rag)
+    for _ in range(min(max_concurrency, len(questions)) - 1):
+        engines.put_nowait(RAGEngine(rag.vs_manager, semantic_cache=rag.cache))
+    
+    async def answer(question: str) -> dict:
+        rag = await engines.get()
+        try:
+            rag.memory.clear()
+            return await rag.aquery(question)
+        finally:
+            engines.put_nowait(rag)
+    
+    return await asyncio.gather(*(answer(q) for q in questions))
+
+
+def run_test_queries(max_concurrency: int = 4):
+    """
+    Runs all test queries (from the sample questions provided); queries run concurrently, results are
+    printed in question order afterwards
+    
+    @params:
+        max_concurrency: Num of queries in flight at once
     """
     test_questions = [
         "What was BMW's total revenue in 2023?",
@@ -31,61 +95,57 @@ def run_test_queries():
     ]
     
     try:
-        print(Fore.CYAN + "="*70)
+        print(_SEP)
         print(Fore.CYAN + "RAG AUTOMOTIVE ANALYSIS - TEST QUERIES")
-        print(Fore.CYAN + "="*70)
+        print(_SEP)
         print()
         
         print(Fore.YELLOW + "Initializing RAG system...")
-        vs_manager = VectorStoreManager()
-        vs_manager.load_vectorstore()
-        rag = RAGEngine(vs_manager)
-        chat = ChatInterface(rag)
+        vs_manager, rag, chat = get_rag_system()
+        
+        # embed all questions in one request; the queries below are then served from the query embedding cache
+        vs_manager.embeddings.embed_queries(test_questions)
         
         print(Fore.GREEN + " System initialized successfully\n")
-        print(Fore.CYAN + "="*70)
-        print(f"Running {len(test_questions)} test queries...")
-        print(Fore.CYAN + "="*70 + "\n")
-        
-        # execute each test query and collect results
-        results = []
-        for i, question in enumerate(test_questions, 1):
-            print(f"\n{Fore.CYAN}{'='*70}")
-            print(f"{Fore.CYAN}Query {i}/{len(test_questions)}")
-            print(f"{Fore.CYAN}{'='*70}\n")
-            
-            # run query and display results
-            chat.run_single_query(question, show_sources=True)
+        print(_SEP)
+        print(f"Running {len(test_questions)} test queries ({max_concurrency} at a time)...")
+        print(_SEP + "\n")
+        
+        # queries are network-bound, so overlap them with async calls instead of threads
+        query_results = asyncio.run(_run_all(rag, test_questions, max_concurrency))
+        
+        # display results and accumulate the summary metrics in the same pass
+        successful = with_data = total_answer_length = 0
+        for i, (question, result) in enumerate(zip(test_questions, query_results), 1):
+            sys.stdout.write(_QUERY_BANNER.format(i=i, n=len(test_questions), question=question))
+            chat.print_result(result, show_sources=True)
             
-            # store result metrics for summary
-            result = rag.query(question)
-            results.append({
-                "question": question,
-                "success": result["success"],
-                "answer_length": len(result["answer"]) if result["success"] else 0,
-                "has_data": "don't have that information" not in result["answer"].lower()
-            })
+            if result["success"]:
+                successful += 1
+                total_answer_length += len(result["answer"])
+            if not _NO_DATA_RE.search(result["answer"]):
+                with_data += 1
             
-            print()
+            sys.stdout.write("\n")
+            sys.stdout.flush()
         
         # print summary statistics
-        print(f"\n{Fore.CYAN}{'='*70}")
-        print(f"{Fore.CYAN}TEST SUMMARY")
-        print(f"{Fore.CYAN}{'='*70}\n")
+        total = len(query_results)
+        failed = total - successful
+        avg_answer_length = total_answer_length / successful if successful > 0 else 0
         
-        successful = sum(1 for r in results if r["success"])
-        with_data = sum(1 for r in results if r["has_data"])
-        failed = len(results) - successful
-        
-        print(f"{Fore.GREEN}Successful queries: {successful}/{len(results)}")
-        print(f"{Fore.GREEN}Queries with actual data: {with_data}/{len(results)}")
+        summary = [
+            _SUMMARY_BANNER,
+            f"{Fore.GREEN}Successful queries: {successful}/{total}\n",
+            f"{Fore.GREEN}Queries with actual data: {with_data}/{total}\n",
+        ]
         if failed > 0:
-            print(f"{Fore.RED}Failed queries: {failed}/{len(results)}")
-        
-        avg_answer_length = sum(r["answer_length"] for r in results if r["success"]) / successful if successful > 0 else 0
-        print(f"\n{Fore.YELLOW}Average answer length: {avg_answer_length:.0f} characters")
+            summary.append(f"{Fore.RED}Failed queries: {failed}/{total}\n")
+        summary.append(f"\n{Fore.YELLOW}Average answer length: {avg_answer_length:.0f} characters\n")
+        summary.append(_NL_SEP + "\n")
         
-        print(f"\n{Fore.CYAN}{'='*70}\n")
+        sys.stdout.write("".join(summary))
+        sys.stdout.flush()
         
     except Exception as e:
         print(f"\n{Fore.RED}Error: {str(e)}")
@@ -104,22 +164,22 @@ def run_interactive_demo():
     ]
     
     try:
-        print(Fore.CYAN + "="*70)
+        print(_SEP)
         print(Fore.CYAN + "RAG AUTOMOTIVE ANALYSIS - INTERACTIVE DEMO")
-        print(Fore.CYAN + "="*70)
+        print(_SEP)
         print()
         
         # initialize RAG system components
         print(Fore.YELLOW + "Initializing RAG system...")
-        vs_manager = VectorStoreManager()
-        vs_manager.load_vectorstore()
-        rag = RAGEngine(vs_manager)
-        chat = ChatInterface(rag)
+        _, rag, chat = get_rag_system()
+        
+        # the demo relies on its own conversation context
+        rag.memory.clear()
         
         print(Fore.GREEN + " System initialized successfully\n")
-        print(Fore.CYAN + "="*70)
+        print(_SEP)
         print("Running interactive demo...")
-        print(Fore.CYAN + "="*70 + "\n")
+        print(_SEP + "\n")
         
         for i, question in enumerate(demo_questions, 1):
             print(f"\n{Fore.CYAN}Question {i}: {Fore.WHITE}{question}")
@@ -136,10 +196,10 @@ def run_interactive_demo():
             
             print()
         
-        print(f"\n{Fore.CYAN}{'='*70}")
+        print(_NL_SEP, end="")
         print(f"{Fore.GREEN}Demo completed!")
         print(f"{Fore.YELLOW}Notice how the second question used context from the first.")
-        print(f"{Fore.CYAN}{'='*70}\n")
+        print(_SEP + "\n")
         
     except Exception as e:
         print(f"\n{Fore.RED}Error: {str(e)}")